@@ -0,0 +1 @@
+"""Runtime helpers shared by the agents in this repo (plugins, model wrappers, tool helpers)."""
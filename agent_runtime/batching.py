@@ -0,0 +1,175 @@
+"""
+Cross-session micro-batching of model requests for offline jobs.
+
+When thousands of BlogPipeline or CodePipelineAgent sessions run overnight, each session
+sends its own generate_content request per stage. BatchingLlm wraps an agent's model: batch
+traffic (see agent_runtime.traffic) is collected by a MicroBatcher for up to `max_wait_ms`
+or `max_batch_size` requests per model and tenant, submitted through a BatchBackend in one
+call, and each response is routed back to the coroutine that asked for it. Interactive
+traffic keeps the direct path to the wrapped model.
+
+With a RequestScheduler (agent_runtime.scheduler), each submitted batch holds one BATCH slot
+of the scheduler while it runs. Enable scheduling before batching; see the scheduler
+module for the supported order.
+
+LocalBatchBackend is a stand-in that runs a batch against a regular model, so the pipeline
+can be exercised locally. A backend for a batch-prediction endpoint implements the same
+`predict` method.
+
+Example:
+
+    batcher = MicroBatcher(LocalBatchBackend(Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config)))
+    enable_batching(root_agent, batcher)
+    with traffic(BATCH):
+        await asyncio.gather(*(run_session(topic) for topic in topics))
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, AsyncGenerator, Dict, List, Optional, Tuple, Union
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from pydantic import ConfigDict
+
+from .traffic import BATCH, current_tenant, current_traffic_class
+from .util import wrap_models
+
+if TYPE_CHECKING:
+    from .scheduler import RequestScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class BatchBackend(ABC):
+    """Submits a list of requests in one call and returns one response (or exception) per request, in order."""
+
+    @abstractmethod
+    async def predict(self, requests: List[LlmRequest]) -> List[Union[LlmResponse, BaseException]]:
+        ...
+
+
+class LocalBatchBackend(BatchBackend):
+    """Local stand-in for a batch-prediction endpoint: runs each request on `llm`, `concurrency` at a time.
+
+    `llm` must be a plain model, not a BatchingLlm, or batch requests would be batched again,
+    nor a ScheduledLlm, or every request of a batch would wait for a scheduler slot of its own.
+    """
+
+    def __init__(self, llm: BaseLlm, concurrency: int = 8):
+        self.llm = llm
+        self.concurrency = concurrency
+
+    async def predict(self, requests: List[LlmRequest]) -> List[Union[LlmResponse, BaseException]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(llm_request: LlmRequest) -> LlmResponse:
+            async with semaphore:
+                response = None
+                async for response in self.llm.generate_content_async(llm_request, stream=False):
+                    pass
+                if response is None:
+                    raise RuntimeError(f"{self.llm.model} returned no response.")
+                return response
+
+        return await asyncio.gather(*(run_one(r) for r in requests), return_exceptions=True)
+
+
+class MicroBatcher:
+    """Collects requests per model and tenant for up to `max_wait_ms` or `max_batch_size` items, then submits them together."""
+
+    def __init__(
+        self,
+        backend: BatchBackend,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 200,
+        scheduler: Optional["RequestScheduler"] = None,
+    ):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.scheduler = scheduler
+        self.batches_sent = 0
+        self.requests_sent = 0
+        self._pending: Dict[Tuple[str, str], List[Tuple[LlmRequest, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._in_flight = set()
+
+    async def submit(self, llm_request: LlmRequest) -> LlmResponse:
+        loop = asyncio.get_running_loop()
+        key = (llm_request.model or "", current_tenant())
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((llm_request, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(key)
+        elif len(pending) == 1:
+            self._timers[key] = loop.call_later(self.max_wait_ms / 1000, self._flush, key)
+        return await future
+
+    def _flush(self, key: Tuple[str, str]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        # Callers that gave up (cancelled) while waiting are dropped before the batch is sent.
+        items = [(r, f) for r, f in self._pending.pop(key, []) if not f.done()]
+        if not items:
+            return
+        task = asyncio.get_running_loop().create_task(self._run_batch(items, tenant=key[1]))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _run_batch(self, items: List[Tuple[LlmRequest, asyncio.Future]], tenant: str):
+        try:
+            if self.scheduler is None:
+                results = await self._predict(items)
+            else:
+                async with self.scheduler.slot(BATCH, tenant):
+                    results = await self._predict(items)
+        except Exception as e:
+            results = [e] * len(items)
+        if len(results) != len(items):
+            error = RuntimeError(f"Batch backend returned {len(results)} results for {len(items)} requests.")
+            logger.error("%s", error)
+            results = list(results[: len(items)]) + [error] * (len(items) - len(results))
+        for (_, future), result in zip(items, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _predict(self, items: List[Tuple[LlmRequest, asyncio.Future]]) -> List[Union[LlmResponse, BaseException]]:
+        self.batches_sent += 1
+        self.requests_sent += len(items)
+        logger.debug("Submitting batch of %d requests for %s", len(items), items[0][0].model)
+        return await self.backend.predict([r for r, _ in items])
+
+
+class BatchingLlm(BaseLlm):
+    """Sends batch traffic through a MicroBatcher and everything else straight to `llm`."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    llm: BaseLlm
+    batcher: MicroBatcher
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if current_traffic_class() != BATCH:
+            async for response in self.llm.generate_content_async(llm_request, stream=stream):
+                yield response
+            return
+        # Batch prediction has no streaming: the whole response arrives at once.
+        yield await self.batcher.submit(llm_request)
+
+    def connect(self, llm_request: LlmRequest):
+        return self.llm.connect(llm_request)
+
+
+def enable_batching(root_agent, batcher: MicroBatcher):
+    """Wraps the model of every LlmAgent in the tree with a BatchingLlm sharing `batcher`."""
+    wrap_models(root_agent, lambda llm: BatchingLlm(model=llm.model, llm=llm, batcher=batcher))
@@ -0,0 +1,297 @@
+"""
+Event-loop blocking detection and executor offload.
+
+asyncio/blocking_vs_nonblocking.py shows how a single `time.sleep` freezes every
+other coroutine. The same happens in an agent server: a sync FunctionTool runs
+directly on the event loop, so while it works every other in-flight session waits.
+
+- LoopLagMonitor measures event-loop lag. When the loop stalls for longer than a
+  threshold, a watchdog thread takes a stack snapshot of whatever is holding it.
+- run_blocking / blocking run declared-blocking calls on a bounded thread pool.
+- run_cpu_bound runs picklable CPU-heavy calls on an optional process pool.
+- offload_sync_tools rewires every sync FunctionTool in an agent tree onto the pools.
+- BlockingDetectorPlugin runs the monitor during runs and labels stalls with the
+  agent or tool that was executing.
+
+Example:
+
+    offload_sync_tools(root_agent, cpu_bound_tools=["render_thumbnail"])
+    runner = Runner(agent=root_agent, ..., plugins=[BlockingDetectorPlugin(threshold=0.1)])
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.tools.function_tool import FunctionTool
+
+from .util import iter_agents, on_run_task_done
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_THREADS = 8
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_max_threads = DEFAULT_MAX_THREADS
+_max_processes: Optional[int] = None
+
+
+def configure_executors(max_threads: int = DEFAULT_MAX_THREADS, max_processes: Optional[int] = None):
+    """Sets the pool sizes. Call before the first offloaded call; running pools are replaced."""
+    global _thread_pool, _process_pool, _max_threads, _max_processes
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False)
+        _process_pool = None
+    _max_threads = max_threads
+    _max_processes = max_processes
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=_max_threads, thread_name_prefix="agent-blocking")
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=_max_processes)
+    return _process_pool
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """Runs a blocking call on the bounded thread pool, keeping the caller's contextvars."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_get_thread_pool(), call)
+
+
+async def run_cpu_bound(func: Callable, *args, **kwargs):
+    """Runs a CPU-heavy call on the process pool. `func` and its arguments must be picklable."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_process_pool(), functools.partial(func, *args, **kwargs))
+
+
+def blocking(func: Callable) -> Callable:
+    """Decorator declaring a sync function as blocking: calling it returns an awaitable run on the thread pool."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_blocking(func, *args, **kwargs)
+
+    return wrapper
+
+
+def offload_tool(func: Callable, cpu_bound: bool = False) -> Callable:
+    """Returns an async version of a sync tool function that runs on the thread (or process) pool.
+
+    The wrapper keeps the original signature, name and docstring, so FunctionTool builds the
+    same declaration and still injects `tool_context`. Async functions are returned unchanged.
+    For cpu_bound tools, keep the module-level name bound to the original function so that
+    it can be pickled: `FunctionTool(offload_tool(score_draft, cpu_bound=True))`.
+    """
+    if inspect.iscoroutinefunction(func):
+        return func
+    if cpu_bound and "tool_context" in inspect.signature(func).parameters:
+        raise ValueError(f"{func.__name__} takes tool_context, which cannot be sent to a worker process.")
+    run = run_cpu_bound if cpu_bound else run_blocking
+
+    @functools.wraps(func)
+    async def wrapper(**kwargs):
+        return await run(func, **kwargs)
+
+    return wrapper
+
+
+def offload_sync_tools(root_agent, cpu_bound_tools: Iterable[str] = ()):
+    """Moves every sync FunctionTool (or plain function tool) in the agent tree onto the pools.
+
+    Tools named in cpu_bound_tools go to the process pool, everything else to the thread pool.
+    """
+    cpu_bound_tools = set(cpu_bound_tools)
+    for agent in iter_agents(root_agent):
+        tools = getattr(agent, "tools", None)
+        if not tools:
+            continue
+        for i, tool in enumerate(tools):
+            if isinstance(tool, FunctionTool):
+                tool.func = offload_tool(tool.func, cpu_bound=tool.name in cpu_bound_tools)
+            elif inspect.isfunction(tool):
+                tools[i] = offload_tool(tool, cpu_bound=tool.__name__ in cpu_bound_tools)
+
+
+@dataclass
+class Stall:
+    """One event-loop stall seen by LoopLagMonitor."""
+
+    detected_at: float
+    lag: float  # seconds; updated once the loop recovers
+    task: str
+    label: Optional[str]
+    stack: str
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag and records a stack snapshot for stalls over `threshold` seconds.
+
+    A heartbeat coroutine wakes every `interval` seconds. A watchdog thread notices when the
+    heartbeat is late by more than `threshold` and snapshots the loop thread's stack while the
+    stall is still happening, so the report points at the blocking code itself. Labels set with
+    set_label belong to the calling task, so concurrent sessions do not overwrite each other's.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.05,
+        on_stall: Optional[Callable[[Stall], None]] = None,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.on_stall = on_stall or self._log_stall
+        self._labels: Dict[asyncio.Task, str] = {}  # hints such as "tool exit_loop", per task
+        self.max_lag = 0.0
+        self.stalls: List[Stall] = []
+        self._loop = None
+        self._loop_thread_id = None
+        self._heartbeat = 0.0
+        self._open_stall: Optional[Stall] = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def set_label(self, label: str):
+        """Labels stalls that happen in the current task, until it finishes or is labelled again."""
+        task = asyncio.current_task()
+        if task is None:
+            return
+        if task not in self._labels:
+            task.add_done_callback(self._drop_label)
+        self._labels[task] = label
+
+    def label_of(self, task: Optional[asyncio.Task]) -> Optional[str]:
+        return self._labels.get(task) if task is not None else None
+
+    def _drop_label(self, task: asyncio.Task):
+        self._labels.pop(task, None)
+
+    def start(self):
+        """Starts monitoring the running loop. Must be called from the loop's thread."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        self._task = None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, lag)
+            self._heartbeat = now
+            stall, self._open_stall = self._open_stall, None
+            if stall is not None:
+                stall.lag = lag
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            late = time.monotonic() - self._heartbeat - self.interval
+            if late < self.threshold or self._open_stall is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            task = asyncio.current_task(self._loop)
+            stall = Stall(
+                detected_at=time.time(),
+                lag=late,
+                task=_describe_task(task),
+                label=self.label_of(task),
+                stack="".join(traceback.format_stack(frame)) if frame is not None else "",
+            )
+            self._open_stall = stall
+            self.stalls.append(stall)
+            self.on_stall(stall)
+
+    @staticmethod
+    def _log_stall(stall: Stall):
+        logger.warning(
+            "Event loop blocked for more than %.3fs in %s (%s). Stack of the loop thread:\n%s",
+            stall.lag,
+            stall.task,
+            stall.label or "no agent/tool label",
+            stall.stack,
+        )
+
+
+def _describe_task(task) -> str:
+    if task is None:
+        return "<no task>"
+    coro = task.get_coro()
+    return f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+
+class BlockingDetectorPlugin(BasePlugin):
+    """Runs a LoopLagMonitor while any run is in flight and labels stalls with the active agent or tool."""
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, name: str = "blocking_detector"):
+        super().__init__(name=name)
+        self.monitor = LoopLagMonitor(threshold=threshold, interval=interval)
+        self._active_runs: Dict[str, Callable[[], None]] = {}  # invocation id -> unregister teardown
+
+    async def before_run_callback(self, *, invocation_context):
+        invocation_id = invocation_context.invocation_id
+        self._active_runs[invocation_id] = on_run_task_done(lambda error: self._run_ended(invocation_id))
+        self.monitor.start()
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        unregister = self._active_runs.get(invocation_context.invocation_id)
+        if unregister is not None:
+            unregister()
+        self._run_ended(invocation_context.invocation_id)
+
+    def _run_ended(self, invocation_id: str):
+        if self._active_runs.pop(invocation_id, None) is not None and not self._active_runs:
+            self.monitor.stop()
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        self.monitor.set_label(f"agent {agent.name}")
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        # ADK runs every function call in its own task, so the label ends with the call.
+        self.monitor.set_label(f"tool {tool.name} (agent {tool_context.agent_name})")
+        return None
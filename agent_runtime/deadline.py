@@ -0,0 +1,245 @@
+"""
+End-to-end deadlines for agent runs.
+
+A request to ResearchSystem or StoryPipeline has no overall deadline: every nested Gemini
+call retries on its own retry_config (5 attempts, exp_base=7), so one request can keep
+working for minutes after the client has gone away. run_with_deadline runs an invocation
+under a Deadline:
+
+- the deadline is stored in a contextvar, so it reaches every SequentialAgent,
+  ParallelAgent and LoopAgent branch, AgentTool runs and tool calls started by the run;
+- DeadlinePlugin refuses to start agents, model calls or tools once the deadline has
+  passed, clips each model call's retries to the attempts whose backoff still fits in the
+  remaining budget, and caps each HTTP attempt at the remaining time;
+- on expiry or Deadline.cancel() (e.g. on client disconnect) the run is cancelled
+  immediately, including in-flight model and tool calls. Closing the generator returned by
+  run_with_deadline cancels the run as well;
+- with partial_results=True the generator simply ends on expiry: the events already
+  yielded and the session state written by finished stages are the partial result.
+  Otherwise DeadlineExceeded is raised.
+
+Example:
+
+    runner = Runner(agent=root_agent, ..., plugins=[DeadlinePlugin()])
+    async for event in run_with_deadline(runner, user_id=..., session_id=..., new_message=content, timeout=30):
+        ...
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from typing import AsyncGenerator, Optional
+
+from google.adk.events.event import Event
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+from .traffic import current_traffic_class
+
+logger = logging.getLogger(__name__)
+
+# google-genai's fallbacks for unset (or zero) HttpRetryOptions fields, see google.genai._api_client.retry_args.
+_RETRY_ATTEMPTS = 5
+_RETRY_INITIAL_DELAY = 1.0
+_RETRY_MAX_DELAY = 60.0
+_RETRY_EXP_BASE = 2.0
+_RETRY_JITTER = 1.0
+
+_current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar(
+    "agent_runtime_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a run passes its deadline or is cancelled."""
+
+
+class Deadline:
+    """An absolute point in time (monotonic clock) after which a run's work is abandoned."""
+
+    def __init__(self, timeout: float):
+        self.expires_at = time.monotonic() + timeout
+        self.cancel_reason: Optional[str] = None
+        self._cancelled: Optional[asyncio.Future] = None
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.cancel_reason is not None or time.monotonic() >= self.expires_at
+
+    def cancel(self, reason: str = "cancelled by caller"):
+        """Abandons the run now, e.g. because the client disconnected."""
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+        if self._cancelled is not None and not self._cancelled.done():
+            self._cancelled.set_result(None)
+
+    def check(self, what: str = "work"):
+        if self.expired:
+            raise DeadlineExceeded(f"Not starting {what}: {self.cancel_reason or 'deadline exceeded'}.")
+
+    def _wait_cancelled(self) -> asyncio.Future:
+        if self._cancelled is None:
+            self._cancelled = asyncio.get_running_loop().create_future()
+            if self.cancel_reason is not None:
+                self._cancelled.set_result(None)
+        return self._cancelled
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the run the caller belongs to, if any."""
+    return _current_deadline.get()
+
+
+def _is_deadline_error(error: BaseException) -> bool:
+    # Plugin callbacks run through ADK's PluginManager, which wraps their exceptions.
+    while error is not None:
+        if isinstance(error, DeadlineExceeded):
+            return True
+        error = error.__cause__
+    return False
+
+
+def clip_retry_options(
+    retry_options: Optional[types.HttpRetryOptions], budget: float
+) -> Optional[types.HttpRetryOptions]:
+    """Limits attempts to those whose cumulative backoff fits in `budget` seconds.
+
+    Unset fields take google-genai's defaults, so the backoff is the one the client would use.
+    """
+    if retry_options is None:
+        return None
+    max_attempts = retry_options.attempts or _RETRY_ATTEMPTS
+    delay = retry_options.initial_delay or _RETRY_INITIAL_DELAY
+    exp_base = retry_options.exp_base or _RETRY_EXP_BASE
+    max_delay = retry_options.max_delay or _RETRY_MAX_DELAY
+    jitter = retry_options.jitter or _RETRY_JITTER
+    attempts, waited = 1, 0.0
+    # Worst case of tenacity's wait_exponential_jitter: the jitter is added before the cap.
+    while attempts < max_attempts and waited + min(delay + jitter, max_delay) < budget:
+        waited += min(delay + jitter, max_delay)
+        delay *= exp_base
+        attempts += 1
+    return retry_options.model_copy(update={"attempts": attempts})
+
+
+def _model_retry_options(llm) -> Optional[types.HttpRetryOptions]:
+    # Unwrap agent_runtime model wrappers (BatchingLlm, ScheduledLlm) to find the Gemini
+    # model, preferring the retry options of the caller's traffic class if one sets them.
+    while llm is not None:
+        scheduler = getattr(llm, "scheduler", None)
+        if scheduler is not None and scheduler.retry_options(current_traffic_class()) is not None:
+            return scheduler.retry_options(current_traffic_class())
+        retry_options = getattr(llm, "retry_options", None)
+        if retry_options is not None:
+            return retry_options
+        llm = getattr(llm, "llm", None)
+    return None
+
+
+class DeadlinePlugin(BasePlugin):
+    """Stops new work after the run's deadline and clips model retries to the remaining budget."""
+
+    def __init__(self, name: str = "deadline"):
+        super().__init__(name=name)
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check(f"agent {agent.name}")
+        return None
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        deadline = current_deadline()
+        if deadline is None:
+            return None
+        deadline.check(f"model call for {callback_context.agent_name}")
+        remaining = deadline.remaining()
+        llm_request.config = llm_request.config or types.GenerateContentConfig()
+        http_options = llm_request.config.http_options or types.HttpOptions()
+        base = http_options.retry_options or _model_retry_options(
+            getattr(callback_context._invocation_context.agent, "canonical_model", None)
+        )
+        http_options.retry_options = clip_retry_options(base, remaining)
+        timeout = max(1, int(remaining * 1000))  # milliseconds, per HTTP attempt
+        http_options.timeout = timeout if http_options.timeout is None else min(http_options.timeout, timeout)
+        llm_request.config.http_options = http_options
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check(f"tool {tool.name}")
+        return None
+
+
+async def run_with_deadline(
+    runner,
+    *,
+    user_id: str,
+    session_id: str,
+    new_message: types.Content,
+    timeout: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
+    partial_results: bool = False,
+    **run_kwargs,
+) -> AsyncGenerator[Event, None]:
+    """Runs `runner.run_async` under a deadline, yielding its events.
+
+    Pass either `timeout` (seconds) or a `deadline` you keep a handle on to cancel it.
+    """
+    if deadline is None:
+        if timeout is None:
+            raise ValueError("Pass timeout or deadline.")
+        deadline = Deadline(timeout)
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def pump():
+        # The whole run happens in this one task, so callbacks that set contextvars in
+        # before_* and read them in after_* keep working.
+        _current_deadline.set(deadline)
+        if deadline.expired:
+            queue.put_nowait(DeadlineExceeded("Deadline passed before the run started."))
+            return
+        try:
+            async for event in runner.run_async(
+                user_id=user_id, session_id=session_id, new_message=new_message, **run_kwargs
+            ):
+                queue.put_nowait(event)
+        except Exception as e:
+            queue.put_nowait(e)
+        else:
+            queue.put_nowait(finished)
+
+    task = asyncio.create_task(pump())
+    cancelled = deadline._wait_cancelled()
+    try:
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {get, cancelled}, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED
+            )
+            if get not in done:
+                get.cancel()
+                break
+            item = get.result()
+            if item is finished:
+                return
+            if isinstance(item, BaseException):
+                if _is_deadline_error(item):
+                    break
+                raise item
+            yield item
+    finally:
+        # Expiry, cancellation, errors and a consumer that stops iterating all end up here.
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+
+    reason = deadline.cancel_reason or "deadline exceeded"
+    logger.warning("Run for session %s stopped: %s.", session_id, reason)
+    if not partial_results:
+        raise DeadlineExceeded(f"Run for session {session_id} stopped: {reason}.")
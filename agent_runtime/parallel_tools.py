@@ -0,0 +1,129 @@
+"""
+Concurrent execution of the function calls in one model turn.
+
+Since google-adk 1.10 the function calls of a single model response are started as separate
+tasks and gathered, so two AgentTool calls, or google_search plus a FunctionTool, already
+overlap, and the merged response keeps the order of the calls. What ADK does not provide:
+
+- a cap on how many calls from one turn run at once;
+- isolation of errors: an exception in one call is re-raised from the gather, which fails
+  the whole turn and throws away the results of its siblings;
+- a record of how long each call took.
+
+ParallelToolCallsPlugin adds those three. Errors are recorded and left to propagate by
+default. With return_errors=True they are returned to the model as that call's response
+({"error": ...}) while sibling calls carry on. ADK stops at the first plugin whose
+on_tool_error_callback returns a response, so in that mode put the plugin last: plugins
+after it never see tool errors. Sync tools still run on the event loop and serialize the
+turn; move them onto a thread pool with agent_runtime.blocking.offload_sync_tools.
+
+Example:
+
+    runner = Runner(
+        agent=root_agent,
+        ...,
+        plugins=[..., ParallelToolCallsPlugin(max_concurrent_calls=4, return_errors=True)],
+    )
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ToolCallRecord:
+    invocation_id: str
+    agent_name: str
+    tool_name: str
+    function_call_id: str
+    waited: float  # seconds spent waiting for the per-turn cap
+    duration: float  # seconds spent in the tool and its callbacks
+    error: Optional[str] = None
+
+
+class ParallelToolCallsPlugin(BasePlugin):
+    """Caps, times and isolates the concurrent function calls of each model turn."""
+
+    def __init__(
+        self,
+        max_concurrent_calls: int = 4,
+        max_records: int = 1000,
+        return_errors: bool = False,
+        name: str = "parallel_tool_calls",
+    ):
+        super().__init__(name=name)
+        self.max_concurrent_calls = max_concurrent_calls
+        self.return_errors = return_errors
+        self.max_records = max_records
+        self.records: List[ToolCallRecord] = []
+        # An agent's turns run one after another, so one semaphore per agent run is one per turn.
+        self._semaphores: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self._calls: Dict[str, Tuple[float, float, Optional[str]]] = {}
+        self._permits: Dict[str, asyncio.Semaphore] = {}  # function call id -> semaphore it holds
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        key = (tool_context.invocation_id, tool_context.agent_name)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._semaphores[key] = asyncio.Semaphore(self.max_concurrent_calls)
+        queued_at = time.monotonic()
+        await semaphore.acquire()
+        call_id = tool_context.function_call_id
+        self._permits[call_id] = semaphore
+        self._calls[call_id] = (queued_at, time.monotonic(), None)
+        # after_tool_callback is skipped when an earlier plugin overrides the result, a later
+        # before_tool callback raises, or the turn is cancelled. ADK runs every function call
+        # in its own task, so the end of that task releases the permit in all of those cases.
+        asyncio.current_task().add_done_callback(lambda _: self._release(call_id))
+        return None
+
+    def _release(self, call_id: str):
+        self._calls.pop(call_id, None)
+        semaphore = self._permits.pop(call_id, None)
+        if semaphore is not None:
+            semaphore.release()
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        call = self._calls.get(tool_context.function_call_id)
+        if call is not None:
+            self._calls[tool_context.function_call_id] = call[:2] + (f"{type(error).__name__}: {error}",)
+        logger.warning("Tool %s failed in %s: %s", tool.name, tool_context.agent_name, error)
+        if not self.return_errors:
+            # The error propagates and after_tool_callback is skipped, so record the call now.
+            self._record(tool, tool_context)
+            return None
+        return {"error": f"{tool.name} failed: {error}"}
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        self._record(tool, tool_context)
+        return None
+
+    def _record(self, tool, tool_context):
+        # Releases the permit as soon as the tool has finished, ahead of the end of its task.
+        call = self._calls.get(tool_context.function_call_id)
+        if call is None:
+            return
+        queued_at, started_at, error = call
+        self._release(tool_context.function_call_id)
+        record = ToolCallRecord(
+            invocation_id=tool_context.invocation_id,
+            agent_name=tool_context.agent_name,
+            tool_name=tool.name,
+            function_call_id=tool_context.function_call_id,
+            waited=started_at - queued_at,
+            duration=time.monotonic() - started_at,
+            error=error,
+        )
+        self.records.append(record)
+        del self.records[: -self.max_records]
+        logger.debug("Tool %s in %s took %.2fs (waited %.2fs)", tool.name, record.agent_name, record.duration, record.waited)
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        self._semaphores.pop((callback_context.invocation_id, agent.name), None)
+        return None
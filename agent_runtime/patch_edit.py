@@ -0,0 +1,219 @@
+"""
+Diff-based refinement output for rewrite stages.
+
+RefinerAgent regenerates the whole `current_story` on every LoopAgent iteration and
+CodeRefactorerAgent re-emits the whole code block even when the review asks for a two-line
+fix, and output tokens are the slowest part of a generation. In edit mode the agent is told
+to answer with search/replace blocks against the current state value:
+
+    <<<<<<< SEARCH
+    exact text copied from the current version
+    =======
+    replacement text
+    >>>>>>> REPLACE
+
+The blocks are applied and validated locally and the agent's response is replaced with the
+full patched text, so `output_key` and later stages still see a complete value. If a block
+does not match exactly once, or validation fails, the model is asked once more for a full
+rewrite. If that rewrite is empty, is another patch or fails validation, the current
+version is kept unchanged. Responses without blocks are treated as full rewrites and left
+untouched.
+
+Example:
+
+    enable_patch_edits(refiner_agent)  # patches state["current_story"]
+    enable_patch_edits(code_refactorer_agent, source_key="generated_code", validate=python_code_validator)
+
+In SSE streaming mode the raw blocks are streamed as partial events before the final
+patched text replaces them.
+
+The full-rewrite retry is sent from the agent's after_model_callback straight to
+`agent.canonical_model`, outside ADK's model-call flow: Runner plugins (deadlines, tracing,
+the semantic cache) and the agent's other model callbacks do not see it. Its latency and
+tokens count towards the model call that returned the rejected patch.
+"""
+import logging
+import re
+from typing import Callable, List, Optional, Tuple
+
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+PATCH_INSTRUCTION = """
+
+EDIT MODE: the current version is applied as a patch locally, so do not repeat unchanged text.
+If only parts need to change, output ONLY search/replace blocks, in order, in this exact format:
+<<<<<<< SEARCH
+exact text copied from the current version
+=======
+replacement text
+>>>>>>> REPLACE
+Every SEARCH section must match the current version exactly once; include enough surrounding text to make it unique.
+If most of the text changes, output the complete new version instead, without any blocks."""
+
+FULL_REWRITE_INSTRUCTION = """
+
+Output the complete revised version, not a patch."""
+
+_BLOCK = re.compile(
+    r"<<<<<<< SEARCH\n(?P<search>.*?)\n?=======\n(?P<replace>.*?)\n?>>>>>>> REPLACE",
+    re.DOTALL,
+)
+_PYTHON_BLOCK = re.compile(r"```(?:python)?\n(?P<code>.*?)```", re.DOTALL)
+
+
+class PatchError(ValueError):
+    """Raised when a patch does not apply cleanly to the current text."""
+
+
+def parse_patch(text: str) -> Optional[List[Tuple[str, str]]]:
+    """Returns the (search, replace) blocks in `text`, or None if it contains no blocks."""
+    hunks = [(m.group("search"), m.group("replace")) for m in _BLOCK.finditer(text)]
+    return hunks or None
+
+
+def apply_patch(source: str, hunks: List[Tuple[str, str]]) -> str:
+    """Applies search/replace blocks in order. Each search text must occur exactly once."""
+    result = source
+    for i, (search, replace) in enumerate(hunks, start=1):
+        # Models add or drop blank lines at the end of either section; trailing newlines are
+        # not part of the edit, so the line break after the matched text stays in place.
+        search, replace = search.rstrip("\n"), replace.rstrip("\n")
+        if not search.strip():
+            raise PatchError(f"block {i} has an empty SEARCH section")
+        count = result.count(search)
+        if count == 1 and not replace and result.count(search + "\n") == 1:
+            search += "\n"  # deleted lines take their line break with them
+        if count == 0 and result.count(search.strip()) == 1:
+            # Models often add or drop whitespace around the copied text. The source keeps its
+            # own whitespace at those edges, so drop it from the same edges of the replacement.
+            if search != search.lstrip():
+                replace = replace.lstrip()
+            if search != search.rstrip():
+                replace = replace.rstrip()
+            search = search.strip()
+            count = 1
+        if count != 1:
+            raise PatchError(f"block {i} SEARCH text matches {count} times, expected exactly once")
+        result = result.replace(search, replace, 1)
+    return result
+
+
+def python_code_validator(text: str):
+    """Raises SyntaxError if the (optionally fenced) Python code in `text` does not compile."""
+    match = _PYTHON_BLOCK.search(text)
+    compile(match.group("code") if match else text, "<patched>", "exec")
+
+
+def _response_text(llm_response: LlmResponse) -> Optional[str]:
+    """Text of a plain-text response, or None if it has no text or calls a function."""
+    if not llm_response.content or not llm_response.content.parts:
+        return None
+    parts = llm_response.content.parts
+    if any(part.function_call for part in parts) or all(part.text is None for part in parts):
+        return None
+    return "".join(part.text or "" for part in parts)
+
+
+class PatchEditor:
+    """Before/after model callbacks implementing edit mode for one agent. Use enable_patch_edits."""
+
+    def __init__(self, agent, source_key: str, validate: Optional[Callable[[str], None]] = None):
+        self.agent = agent
+        self.source_key = source_key
+        self.validate = validate
+        self.patches_applied = 0
+        self.full_rewrites = 0
+        self.fallbacks = 0
+        self.rejected_rewrites = 0
+        self._pending = {}
+
+    async def before_model_callback(self, callback_context, llm_request):
+        source = callback_context.state.get(self.source_key)
+        if isinstance(source, str) and source:
+            self._pending[callback_context.invocation_id] = (source, llm_request)
+        return None
+
+    async def after_model_callback(self, callback_context, llm_response):
+        if llm_response.partial:
+            return None
+        pending = self._pending.pop(callback_context.invocation_id, None)
+        text = _response_text(llm_response)
+        if pending is None or text is None:
+            return None
+        hunks = parse_patch(text)
+        if hunks is None:
+            self.full_rewrites += 1
+            return None
+        source, llm_request = pending
+        try:
+            patched = apply_patch(source, hunks)
+            if not patched.strip():
+                raise PatchError("patched text is empty")
+            if self.validate is not None:
+                self.validate(patched)
+        except (PatchError, SyntaxError, ValueError) as e:
+            self.fallbacks += 1
+            logger.warning("%s: patch for %s rejected (%s); requesting a full rewrite.", self.agent.name, self.source_key, e)
+            return await self._full_rewrite(llm_request, source, llm_response)
+        self.patches_applied += 1
+        logger.info("%s: applied %d block(s) to %s.", self.agent.name, len(hunks), self.source_key)
+        return _with_text(llm_response, patched)
+
+    async def _full_rewrite(self, llm_request, source: str, llm_response: LlmResponse) -> LlmResponse:
+        request = llm_request.model_copy(deep=True)
+        instruction = request.config.system_instruction if request.config else None
+        if isinstance(instruction, str):
+            request.config.system_instruction = instruction.replace(PATCH_INSTRUCTION.strip(), "") + FULL_REWRITE_INSTRUCTION
+        response = None
+        async for response in self.agent.canonical_model.generate_content_async(request, stream=False):
+            pass
+        text = _response_text(response) if response is not None else None
+        try:
+            if text is None or not text.strip():
+                raise PatchError("the full rewrite returned no text")
+            if parse_patch(text) is not None:
+                raise PatchError("the full rewrite is another patch")
+            if self.validate is not None:
+                self.validate(text)
+        except (PatchError, SyntaxError, ValueError) as e:
+            # Writing raw blocks or invalid text to the state key would corrupt it.
+            self.rejected_rewrites += 1
+            logger.warning("%s: full rewrite of %s rejected (%s); keeping the current version.", self.agent.name, self.source_key, e)
+            return _with_text(llm_response, source)
+        return response
+
+
+def _with_text(llm_response: LlmResponse, text: str) -> LlmResponse:
+    return llm_response.model_copy(update={"content": types.Content(role="model", parts=[types.Part(text=text)])})
+
+
+def _add_callback(agent, field: str, callback):
+    existing = getattr(agent, field)
+    if existing is None:
+        callbacks = []
+    elif isinstance(existing, list):
+        callbacks = list(existing)
+    else:
+        callbacks = [existing]
+    setattr(agent, field, callbacks + [callback])
+
+
+def enable_patch_edits(agent, source_key: Optional[str] = None, validate: Optional[Callable[[str], None]] = None) -> PatchEditor:
+    """Switches an LlmAgent with a string instruction to edit mode.
+
+    `source_key` is the state key holding the text being revised; it defaults to the agent's
+    output_key (e.g. RefinerAgent revises and overwrites "current_story").
+    """
+    source_key = source_key or agent.output_key
+    if not source_key:
+        raise ValueError(f"{agent.name} has no output_key; pass source_key explicitly.")
+    if not isinstance(agent.instruction, str):
+        raise TypeError(f"{agent.name} uses an instruction provider; edit mode needs a string instruction.")
+    editor = PatchEditor(agent, source_key, validate)
+    agent.instruction = agent.instruction + PATCH_INSTRUCTION
+    _add_callback(agent, "before_model_callback", editor.before_model_callback)
+    _add_callback(agent, "after_model_callback", editor.after_model_callback)
+    return editor
@@ -0,0 +1,261 @@
+"""
+Priority-aware scheduling of model calls.
+
+Interactive shorts requests and bulk BlogPipeline jobs share one Gemini quota. Without a
+scheduler a large batch run fills the quota, interactive calls start hitting 429s and fall
+into the 7s/49s retry backoff. RequestScheduler sits in front of every model call:
+
+- each traffic class (see agent_runtime.traffic) has a priority and its own concurrency
+  share of the global limit;
+- within a class, tenants are served by weighted fair queuing (start-time fair queuing), so
+  one tenant's burst does not starve the others;
+- when a higher-priority class spikes (its in-flight plus queued requests reach
+  spike_threshold; requests queued behind its own concurrency share do not count),
+  preemptible classes drop to their preempted_concurrency. Their queued, not-yet-sent
+  requests are held back before the global limit is reached, leaving headroom for the
+  spiking class. Requests already sent are never interrupted;
+- a class can use its own HttpRetryOptions, e.g. fewer, longer retries for batch traffic;
+- stats() reports queue depth, in-flight and dispatched counts per class, and how many
+  requests the lowered limit kept from being sent.
+
+Example:
+
+    scheduler = RequestScheduler(max_concurrency=16)
+    enable_scheduling(root_agent, scheduler)
+    with traffic(BATCH, tenant="nightly-blogs"):
+        ...
+
+Combined with agent_runtime.batching, enable scheduling first and batching second, and give
+the MicroBatcher the same scheduler. The resulting BatchingLlm(ScheduledLlm(model)) sends
+interactive calls through a scheduler slot each, and each micro-batch takes one BATCH slot
+while it is submitted. The batch backend must call the plain model, not the ScheduledLlm:
+
+    enable_scheduling(root_agent, scheduler)
+    enable_batching(root_agent, MicroBatcher(LocalBatchBackend(gemini), scheduler=scheduler))
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from pydantic import ConfigDict
+
+from .traffic import BATCH, DEFAULT_TENANT, INTERACTIVE, current_tenant, current_traffic_class
+from .util import wrap_models
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClassConfig:
+    priority: int  # lower is served first
+    max_concurrency: int
+    preemptible: bool = False
+    preempted_concurrency: int = 0  # limit while a higher-priority class spikes
+    retry_options: Optional[types.HttpRetryOptions] = None
+
+
+def default_classes() -> Dict[str, ClassConfig]:
+    return {
+        INTERACTIVE: ClassConfig(priority=0, max_concurrency=8),
+        BATCH: ClassConfig(priority=1, max_concurrency=4, preemptible=True, preempted_concurrency=1),
+    }
+
+
+@dataclass
+class _Waiter:
+    tenant: str
+    future: asyncio.Future
+    held_back: bool = False
+
+
+@dataclass
+class _ClassState:
+    config: ClassConfig
+    queue: List[Tuple[float, int, _Waiter]] = field(default_factory=list)
+    virtual_time: float = 0.0
+    tenant_finish: Dict[str, float] = field(default_factory=dict)
+    in_flight: int = 0
+    dispatched: int = 0
+    held_back: int = 0
+    max_queue_depth: int = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, waiter in self.queue if not waiter.future.done())
+
+
+class RequestScheduler:
+    """Admits model calls by class priority, per-class concurrency and weighted fair queuing across tenants."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        classes: Optional[Dict[str, ClassConfig]] = None,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        spike_threshold: int = 4,
+    ):
+        self.max_concurrency = max_concurrency
+        self.tenant_weights = tenant_weights or {}
+        self.spike_threshold = spike_threshold
+        self._classes = {name: _ClassState(config) for name, config in (classes or default_classes()).items()}
+        self._order = sorted(self._classes, key=lambda name: self._classes[name].config.priority)
+        self._sequence = itertools.count()
+
+    @property
+    def in_flight(self) -> int:
+        return sum(state.in_flight for state in self._classes.values())
+
+    def retry_options(self, traffic_class: str) -> Optional[types.HttpRetryOptions]:
+        state = self._classes.get(traffic_class)
+        return state.config.retry_options if state else None
+
+    def _state(self, traffic_class: str) -> _ClassState:
+        if traffic_class not in self._classes:
+            raise ValueError(f"Unknown traffic class {traffic_class!r}; configured: {sorted(self._classes)}")
+        return self._classes[traffic_class]
+
+    def _preempted(self, name: str) -> bool:
+        """True while a higher-priority class spikes: its admissible load reaches spike_threshold."""
+        state = self._classes[name]
+        if not state.config.preemptible:
+            return False
+        for other in self._order:
+            higher = self._classes[other]
+            if higher.config.priority >= state.config.priority:
+                return False
+            # Requests queued behind the class's own share could not use the headroom.
+            demand = min(higher.in_flight + higher.queued, higher.config.max_concurrency)
+            if demand >= self.spike_threshold:
+                return True
+        return False
+
+    def _limit(self, name: str) -> int:
+        config = self._classes[name].config
+        return config.preempted_concurrency if self._preempted(name) else config.max_concurrency
+
+    async def acquire(self, traffic_class: str = INTERACTIVE, tenant: str = DEFAULT_TENANT):
+        state = self._state(traffic_class)
+        # Start-time fair queuing: a tenant's requests are spaced 1/weight apart in virtual time.
+        start = max(state.virtual_time, state.tenant_finish.get(tenant, 0.0))
+        state.tenant_finish[tenant] = start + 1.0 / self.tenant_weights.get(tenant, 1.0)
+        waiter = _Waiter(tenant, asyncio.get_running_loop().create_future())
+        heapq.heappush(state.queue, (start, next(self._sequence), waiter))
+        self._dispatch()
+        if not waiter.future.done():
+            state.max_queue_depth = max(state.max_queue_depth, state.queued)
+            logger.debug("Queued %s request for tenant %s: %s", traffic_class, tenant, self.stats())
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted just as the caller gave up; hand it on.
+                self.release(traffic_class)
+            else:
+                # A request that leaves the queue can end a spike.
+                self._dispatch()
+            raise
+
+    def release(self, traffic_class: str = INTERACTIVE):
+        self._state(traffic_class).in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        # Classes are served in priority order. A class capped by its own limit leaves the
+        # remaining global slots to lower-priority classes, unless they are preempted.
+        for name in self._order:
+            state = self._classes[name]
+            limit = self._limit(name)
+            while state.queue and self.in_flight < self.max_concurrency and state.in_flight < limit:
+                start, _, waiter = heapq.heappop(state.queue)
+                if waiter.future.done():
+                    continue
+                state.virtual_time = start
+                state.in_flight += 1
+                state.dispatched += 1
+                waiter.future.set_result(None)
+            if limit < state.config.max_concurrency:
+                self._mark_held_back(state)
+
+    def _mark_held_back(self, state: _ClassState):
+        # Only the requests the class's normal limit and the global limit would admit right
+        # now are held back by preemption; the rest wait on those limits anyway.
+        room = min(state.config.max_concurrency - state.in_flight, self.max_concurrency - self.in_flight)
+        if room <= 0:
+            return
+        waiting = [item for item in state.queue if not item[2].future.done()]
+        for _, _, waiter in heapq.nsmallest(room, waiting):
+            if not waiter.held_back:
+                waiter.held_back = True
+                state.held_back += 1
+
+    @asynccontextmanager
+    async def slot(self, traffic_class: str = INTERACTIVE, tenant: str = DEFAULT_TENANT):
+        await self.acquire(traffic_class, tenant)
+        try:
+            yield
+        finally:
+            self.release(traffic_class)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-class queue depth, in-flight, dispatched and held-back counts."""
+        return {
+            name: {
+                "queued": state.queued,
+                "in_flight": state.in_flight,
+                "dispatched": state.dispatched,
+                "held_back": state.held_back,  # requests the preempted limit kept from being sent
+                "max_queue_depth": state.max_queue_depth,
+            }
+            for name, state in self._classes.items()
+        }
+
+
+class ScheduledLlm(BaseLlm):
+    """Runs each call to `llm` inside a RequestScheduler slot for the caller's traffic class and tenant."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    llm: BaseLlm
+    scheduler: RequestScheduler
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        traffic_class = current_traffic_class()
+        retry_options = self.scheduler.retry_options(traffic_class)
+        if retry_options is not None:
+            llm_request.config = llm_request.config or types.GenerateContentConfig()
+            llm_request.config.http_options = llm_request.config.http_options or types.HttpOptions()
+            if llm_request.config.http_options.retry_options is None:
+                llm_request.config.http_options.retry_options = retry_options
+        async with self.scheduler.slot(traffic_class, current_tenant()):
+            async for response in self.llm.generate_content_async(llm_request, stream=stream):
+                yield response
+
+    def connect(self, llm_request: LlmRequest):
+        return self.llm.connect(llm_request)
+
+
+def enable_scheduling(root_agent, scheduler: RequestScheduler):
+    """Wraps the model of every LlmAgent in the tree with a ScheduledLlm sharing `scheduler`.
+
+    Call it before agent_runtime.batching.enable_batching, see the module docstring.
+    """
+    from .batching import BatchingLlm
+
+    def wrap(llm: BaseLlm) -> ScheduledLlm:
+        if isinstance(llm, BatchingLlm):
+            raise ValueError(
+                "enable_scheduling must be called before enable_batching; pass the scheduler to the MicroBatcher."
+            )
+        return ScheduledLlm(model=llm.model, llm=llm, scheduler=scheduler)
+
+    wrap_models(root_agent, wrap)
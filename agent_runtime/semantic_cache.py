@@ -0,0 +1,360 @@
+"""
+Semantic near-duplicate cache for research and topic-driven agents.
+
+Users of ResearchCoordinator, the ParallelResearchTeam researchers and ShortsScriptWriter
+send near-identical topics ("latest AI agents trends" vs "recent trends in AI agents"), which
+an exact-match cache misses. SemanticCache embeds the topic, looks up the closest cached
+topic with a NumPy cosine-similarity index and returns its response when the similarity is
+above the agent's threshold. Entries expire after a TTL, the least recently used entry is
+evicted when the cache is full, and the index can be persisted to an .npz file.
+
+HashingEmbedder needs no model and is deterministic across processes, which is enough for
+offline tests. It only ignores word order, stopwords and plural "s": "latest trends in AI
+agents" scores 1.0 against "latest AI agents trends", but the paraphrase "recent trends in
+AI agents" scores 0.73, below the unrelated "latest AI agents risks" at 0.74. Keep its
+thresholds at 0.95 or above. To catch paraphrases, pass any callable that maps a list of
+texts to a 2-D array, e.g. a local SentenceTransformer's `encode`, and tune the per-agent
+thresholds on pairs of your own topics. The embedder runs on the thread pool, so a local
+model does not block the event loop.
+
+SemanticCachePlugin caches the first model turn of the listed agents: a request holding
+only the user's topic, with the final text out. Later turns depend on the conversation
+before them and are never served from the cache. Responses that call tools are never
+cached, so coordinators benefit through the cached sub-agents they call. Entries are
+namespaced by agent name and system instruction, so a changed instruction never serves
+stale answers.
+
+Example:
+
+    cache = SemanticCache(path="cache/research.npz")
+    plugin = SemanticCachePlugin(cache, thresholds={"ResearchAgent": 0.95, "ShortsScriptWriter": None})
+    runner = Runner(agent=root_agent, ..., plugins=[plugin])
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+
+from .blocking import run_blocking
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are about as at be by for from how in is it of on or the to what whats which with".split()
+)
+
+
+class HashingEmbedder:
+    """Feature-hashing embeddings of words and character trigrams, L2-normalized.
+
+    Word order and stopwords are ignored and plural "s" is stripped, so reordered or
+    lightly reworded topics land close together.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        features = []
+        for token in _TOKEN.findall(text.lower()):
+            if token in _STOPWORDS:
+                continue
+            if len(token) > 3 and token.endswith("s"):
+                token = token[:-1]
+            features.append(("w:" + token, 1.0))
+            padded = f"#{token}#"
+            features.extend(("c:" + padded[i:i + 3], 0.3) for i in range(len(padded) - 2))
+        return features
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                vectors[row, h % self.dim] += sign * weight
+        return _normalize(vectors)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class VectorIndex:
+    """Dense matrix of unit vectors with top-k cosine search."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.ids: List[str] = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, entry_id: str, vector: np.ndarray):
+        self.ids.append(entry_id)
+        self.vectors = np.vstack([self.vectors, vector.reshape(1, self.dim)])
+
+    def remove(self, entry_id: str):
+        row = self.ids.index(entry_id)
+        del self.ids[row]
+        self.vectors = np.delete(self.vectors, row, axis=0)
+
+    def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[str, float]]:
+        if not self.ids:
+            return []
+        scores = self.vectors @ vector
+        k = min(k, len(self.ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+
+@dataclass
+class CacheEntry:
+    entry_id: str
+    namespace: str
+    text: str
+    value: dict
+    created_at: float
+
+
+class SemanticCache:
+    """Near-duplicate cache keyed by embedded text, with TTL and LRU eviction."""
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+        default_threshold: float = 0.95,
+        ttl_seconds: Optional[float] = 24 * 3600,
+        max_entries: int = 10000,
+        path: Optional[str] = None,
+    ):
+        self.embed_fn = embed_fn or HashingEmbedder()
+        self.default_threshold = default_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()  # least recently used first
+        self._indexes: Dict[str, VectorIndex] = {}
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _embed(self, text: str) -> np.ndarray:
+        return _normalize(np.asarray(self.embed_fn([text]), dtype=np.float32))[0]
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry.created_at > self.ttl_seconds
+
+    def _remove(self, entry_id: str):
+        entry = self._entries.pop(entry_id)
+        index = self._indexes[entry.namespace]
+        index.remove(entry_id)
+        if not len(index):
+            del self._indexes[entry.namespace]
+        self.dirty = True
+
+    def lookup(
+        self, namespace: str, text: str, threshold: Optional[float] = None, vector: Optional[np.ndarray] = None
+    ) -> Optional[Tuple[dict, float]]:
+        """Returns (value, similarity) of the closest live entry above threshold, or None.
+
+        `vector` is the embedding of `text` if the caller has already computed it.
+        """
+        index = self._indexes.get(namespace)
+        if index is None:
+            self.misses += 1
+            return None
+        threshold = self.default_threshold if threshold is None else threshold
+        now = time.time()
+        for entry_id, score in index.search(self._embed(text) if vector is None else vector, k=5):
+            if score < threshold:
+                break
+            entry = self._entries[entry_id]
+            if self._expired(entry, now):
+                self._remove(entry_id)
+                continue
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return entry.value, score
+        self.misses += 1
+        return None
+
+    def put(self, namespace: str, text: str, value: dict, vector: Optional[np.ndarray] = None):
+        if vector is None:
+            vector = self._embed(text)
+        entry = CacheEntry(uuid.uuid4().hex, namespace, text, value, time.time())
+        if namespace not in self._indexes:
+            self._indexes[namespace] = VectorIndex(vector.shape[0])
+        self._indexes[namespace].add(entry.entry_id, vector)
+        self._entries[entry.entry_id] = entry
+        now = time.time()
+        for entry_id in [e.entry_id for e in self._entries.values() if self._expired(e, now)]:
+            self._remove(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        self.dirty = True
+
+    def snapshot(self) -> Tuple[np.ndarray, List[dict]]:
+        """Vectors and entries (in LRU order) as they are now, for writing outside the event loop."""
+        vectors = {}
+        for index in self._indexes.values():
+            vectors.update(zip(index.ids, index.vectors))
+        entries = list(self._entries.values())
+        if not entries:
+            return np.zeros((0, 0), dtype=np.float32), []
+        return np.stack([vectors[e.entry_id] for e in entries]), [asdict(e) for e in entries]
+
+    def save(self, path: Optional[str] = None):
+        """Writes the index to an .npz file, atomically."""
+        write_cache_file(path or self.path, *self.snapshot())
+        self.dirty = False
+
+    def load(self, path: str):
+        with np.load(path) as data:
+            matrix = data["vectors"]
+            entries = [CacheEntry(**e) for e in json.loads(str(data["entries"]))]
+        probe = self._embed("probe")
+        if entries and matrix.shape[1] != probe.shape[0]:
+            logger.warning("Ignoring %s: its vectors do not match the embedding size (%d).", path, probe.shape[0])
+            return
+        self._entries.clear()
+        self._indexes.clear()
+        for entry, vector in zip(entries, matrix):
+            if entry.namespace not in self._indexes:
+                self._indexes[entry.namespace] = VectorIndex(matrix.shape[1])
+            self._indexes[entry.namespace].add(entry.entry_id, vector)
+            self._entries[entry.entry_id] = entry
+        self.dirty = False
+
+
+def write_cache_file(path: str, vectors: np.ndarray, entries: List[dict]):
+    """Writes a snapshot to `path` through a temporary file of its own, so concurrent writers never collide."""
+    buffer = io.BytesIO()
+    np.savez(buffer, vectors=vectors, entries=np.array(json.dumps(entries)))
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _instruction_text(llm_request) -> str:
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    if instruction is None:
+        return ""
+    if isinstance(instruction, str):
+        return instruction
+    parts = getattr(instruction, "parts", None) or []
+    return "".join(part.text or "" for part in parts)
+
+
+def _first_turn_text(llm_request) -> Optional[str]:
+    """Text of the request when it is the agent's first turn: a single content of plain user text."""
+    if not llm_request.contents or len(llm_request.contents) != 1:
+        return None
+    content = llm_request.contents[0]
+    if content.role != "user" or not content.parts:
+        return None
+    if any(part.text is None for part in content.parts):
+        return None
+    return "".join(part.text for part in content.parts).strip() or None
+
+
+def _cacheable(llm_response: LlmResponse) -> bool:
+    if llm_response.partial or llm_response.error_code or not llm_response.content:
+        return False
+    parts = llm_response.content.parts or []
+    return bool(parts) and all(part.text is not None and not part.function_call for part in parts)
+
+
+class SemanticCachePlugin(BasePlugin):
+    """Serves near-duplicate first turns of the agents in `thresholds` from a SemanticCache.
+
+    `thresholds` maps agent names to a similarity threshold (None uses the cache default).
+    """
+
+    def __init__(self, cache: SemanticCache, thresholds: Dict[str, Optional[float]], name: str = "semantic_cache"):
+        super().__init__(name=name)
+        self.cache = cache
+        self.thresholds = thresholds
+        self._pending: Dict[Tuple[str, str], Tuple[str, str, np.ndarray]] = {}
+        self._save_lock: Optional[asyncio.Lock] = None  # created in the loop (Python 3.9 locks bind to one)
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        agent_name = callback_context.agent_name
+        if agent_name not in self.thresholds:
+            return None
+        text = _first_turn_text(llm_request)
+        if text is None:
+            return None
+        digest = hashlib.sha1(_instruction_text(llm_request).encode("utf-8")).hexdigest()[:12]
+        namespace = f"{agent_name}:{digest}"
+        vector = await run_blocking(self.cache._embed, text)
+        hit = self.cache.lookup(namespace, text, self.thresholds[agent_name], vector=vector)
+        if hit is not None:
+            value, score = hit
+            logger.info("Semantic cache hit for %s (similarity %.2f): %r", agent_name, score, text)
+            return LlmResponse.model_validate(value)
+        self._pending[(callback_context.invocation_id, agent_name)] = (namespace, text, vector)
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if llm_response.partial:
+            return None
+        pending = self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if pending is not None and _cacheable(llm_response):
+            namespace, text, vector = pending
+            self.cache.put(namespace, text, llm_response.model_dump(mode="json", exclude_none=True), vector=vector)
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        if not self.cache.path:
+            return
+        # Runs finishing together save one after another; each writes the latest snapshot.
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        async with self._save_lock:
+            if not self.cache.dirty:
+                return
+            snapshot = self.cache.snapshot()
+            self.cache.dirty = False
+            try:
+                await run_blocking(write_cache_file, self.cache.path, *snapshot)
+            except OSError as e:
+                # The cache is an optimization: a failed save must not fail the user's run.
+                self.cache.dirty = True
+                logger.warning("Could not save the semantic cache to %s: %s", self.cache.path, e)
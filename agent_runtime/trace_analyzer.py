@@ -0,0 +1,254 @@
+"""
+Offline analysis of traces written by agent_runtime.tracing.TracingPlugin.
+
+    python -m agent_runtime.trace_analyzer traces/<trace_id>.json
+
+Prints:
+- the critical path: the chain of spans that determined the end-to-end latency,
+- idle time in ParallelAgent joins: how long finished branches waited for the slowest one,
+- retry backoff: time model calls spent sleeping between google-genai retries,
+- time serialized behind independent stages: consecutive sub-agents of a SequentialAgent
+  or of one LoopAgent iteration where the later one reads no state key written by the
+  earlier one, so the two could run in a ParallelAgent.
+
+Dependencies are inferred from state keys only (`output_key` and `{key}` placeholders in
+the instruction). Agents that rely on earlier turns in the conversation history instead of
+state can still look independent, so check a recommendation before restructuring.
+"""
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from .tracing import AGENT, RETRY, Span, read_otlp_json
+
+SERIAL_AGENT_CLASSES = ("SequentialAgent", "LoopAgent")
+PARALLEL_AGENT_CLASSES = ("ParallelAgent",)
+
+
+@dataclass
+class JoinIdle:
+    parallel: Span
+    straggler: Span
+    idle: float  # seconds finished branches spent waiting, summed over branches
+
+
+@dataclass
+class RetryBackoff:
+    model: Span
+    retries: int
+    backoff: float  # seconds slept between attempts
+
+
+@dataclass
+class IndependentStage:
+    parent: str
+    earlier: str
+    later: str
+    serialized: float  # seconds that could overlap, summed over occurrences
+    occurrences: int
+
+
+def _children(spans: List[Span]) -> Dict[str, List[Span]]:
+    children: Dict[str, List[Span]] = {}
+    for span in spans:
+        if span.parent_id:
+            children.setdefault(span.parent_id, []).append(span)
+    for items in children.values():
+        items.sort(key=lambda s: s.start_ns)
+    return children
+
+
+def _roots(spans: List[Span]) -> List[Span]:
+    ids = {span.span_id for span in spans}
+    return [span for span in spans if not span.parent_id or span.parent_id not in ids]
+
+
+def critical_path(spans: List[Span]) -> List[Tuple[Span, int]]:
+    """Returns the critical path as (span, depth) pairs in start order.
+
+    Starting from the end of a span, the path follows the child that finished last, then
+    the latest-finishing child that ended before that one started, and so on.
+    """
+    children = _children(spans)
+    roots = _roots(spans)
+    if not roots:
+        return []
+    root = max(roots, key=lambda s: s.end_ns or s.start_ns)
+
+    def walk(span: Span, depth: int) -> List[Tuple[Span, int]]:
+        path = []
+        cursor = span.end_ns or span.start_ns
+        candidates = list(children.get(span.span_id, []))
+        while candidates:
+            finished = [c for c in candidates if (c.end_ns or c.start_ns) <= cursor]
+            if not finished:
+                break
+            last = max(finished, key=lambda c: c.end_ns or c.start_ns)
+            path = walk(last, depth + 1) + path
+            cursor = last.start_ns
+            candidates = [c for c in candidates if (c.end_ns or c.start_ns) <= cursor and c is not last]
+        return [(span, depth)] + path
+
+    return walk(root, 0)
+
+
+def _agent_children(span: Span, children: Dict[str, List[Span]]) -> List[Span]:
+    return [c for c in children.get(span.span_id, []) if c.kind == AGENT]
+
+
+def parallel_join_idle(spans: List[Span]) -> List[JoinIdle]:
+    """Idle time of finished branches waiting at each ParallelAgent join."""
+    children = _children(spans)
+    result = []
+    for span in spans:
+        if span.kind != AGENT or span.attributes.get("agent.class") not in PARALLEL_AGENT_CLASSES:
+            continue
+        branches = _agent_children(span, children)
+        if len(branches) < 2:
+            continue
+        straggler = max(branches, key=lambda s: s.end_ns or s.start_ns)
+        join = straggler.end_ns or straggler.start_ns
+        idle = sum(join - (b.end_ns or b.start_ns) for b in branches) / 1e9
+        result.append(JoinIdle(parallel=span, straggler=straggler, idle=idle))
+    return result
+
+
+def retry_backoff(spans: List[Span]) -> List[RetryBackoff]:
+    """Backoff time per model span that was retried, longest first."""
+    by_id = {span.span_id: span for span in spans}
+    found: Dict[str, RetryBackoff] = {}
+    for span in spans:
+        if span.kind != RETRY or span.parent_id not in by_id:
+            continue
+        backoff = found.setdefault(span.parent_id, RetryBackoff(by_id[span.parent_id], 0, 0.0))
+        backoff.retries += 1
+        backoff.backoff += span.duration
+    return sorted(found.values(), key=lambda b: b.backoff, reverse=True)
+
+
+def _subtree(span: Span, children: Dict[str, List[Span]]) -> List[Span]:
+    result = [span]
+    for child in children.get(span.span_id, []):
+        result.extend(_subtree(child, children))
+    return result
+
+
+def _iterations(stages: List[Span]) -> List[List[Span]]:
+    """Splits a LoopAgent's stage spans into iterations: a new one starts when a stage repeats."""
+    iterations: List[List[Span]] = []
+    names = set()
+    for stage in stages:
+        if not iterations or stage.name in names:
+            iterations.append([])
+            names = set()
+        iterations[-1].append(stage)
+        names.add(stage.name)
+    return iterations
+
+
+def _consecutive_stages(span: Span, children: Dict[str, List[Span]]) -> List[Tuple[Span, Span]]:
+    # The last stage of one loop iteration and the first of the next are not candidates.
+    pairs = []
+    for stages in _iterations(_agent_children(span, children)):
+        pairs.extend(zip(stages, stages[1:]))
+    return pairs
+
+
+def independent_stages(spans: List[Span]) -> List[IndependentStage]:
+    """Consecutive stages of serial workflow agents where the later stage does not read the earlier's output."""
+    children = _children(spans)
+    found: Dict[Tuple[str, str, str], IndependentStage] = {}
+    for span in spans:
+        if span.kind != AGENT or span.attributes.get("agent.class") not in SERIAL_AGENT_CLASSES:
+            continue
+        for earlier, later in _consecutive_stages(span, children):
+            writes = {s.attributes.get("agent.output_key") for s in _subtree(earlier, children) if s.kind == AGENT}
+            writes.discard("")
+            writes.discard(None)
+            reads = set()
+            for s in _subtree(later, children):
+                if s.kind == AGENT:
+                    reads.update(s.attributes.get("agent.state_reads") or [])
+            if reads & writes:
+                continue
+            key = (span.name, earlier.name, later.name)
+            stage = found.setdefault(key, IndependentStage(span.name, earlier.name, later.name, 0.0, 0))
+            stage.serialized += min(earlier.duration, later.duration)
+            stage.occurrences += 1
+    return sorted(found.values(), key=lambda s: s.serialized, reverse=True)
+
+
+def recommendations(spans: List[Span]) -> List[str]:
+    lines = []
+    for stage in independent_stages(spans):
+        lines.append(
+            f"{stage.later} does not depend on {stage.earlier} (in {stage.parent}): "
+            f"running them in a ParallelAgent could save up to {stage.serialized:.2f}s"
+            + (f" over {stage.occurrences} iterations" if stage.occurrences > 1 else "")
+            + "."
+        )
+    for retried in retry_backoff(spans):
+        if retried.backoff > retried.model.duration / 2:
+            agent = retried.model.attributes.get("agent.name") or retried.model.name
+            lines.append(
+                f"{agent} spent {retried.backoff:.2f}s of a {retried.model.duration:.2f}s model call in "
+                f"{retried.retries} retry backoff(s): lower exp_base or attempts in its retry options."
+            )
+    for join in parallel_join_idle(spans):
+        if join.idle > join.straggler.duration / 2:
+            lines.append(
+                f"{join.parallel.name} waits on {join.straggler.name} ({join.straggler.duration:.2f}s); "
+                f"the other branches sit idle for {join.idle:.2f}s in total."
+            )
+    return lines
+
+
+def print_report(spans: List[Span]):
+    path = critical_path(spans)
+    if not path:
+        print("Trace is empty.")
+        return
+    root = path[0][0]
+    print(f"Trace {root.trace_id}: {root.name} took {root.duration:.2f}s\n")
+
+    print("Critical path:")
+    for span, depth in path:
+        error = f"  ERROR {span.error}" if span.error else ""
+        print(f"  {'  ' * depth}{span.name} [{span.kind}] {span.duration:.2f}s{error}")
+
+    joins = parallel_join_idle(spans)
+    if joins:
+        print("\nParallelAgent join idle time:")
+        for join in joins:
+            print(f"  {join.parallel.name}: {join.idle:.2f}s idle waiting on {join.straggler.name}")
+
+    retried = retry_backoff(spans)
+    if retried:
+        print("\nRetry backoff:")
+        for item in retried:
+            print(f"  {item.model.attributes.get('agent.name') or item.model.name}: {item.retries} retries, {item.backoff:.2f}s")
+
+    stages = independent_stages(spans)
+    if stages:
+        print("\nTime serialized behind independent stages:")
+        for stage in stages:
+            print(f"  {stage.parent}: {stage.earlier} -> {stage.later}  {stage.serialized:.2f}s")
+
+    lines = recommendations(spans)
+    if lines:
+        print("\nRecommendations:")
+        for line in lines:
+            print(f"  - {line}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python -m agent_runtime.trace_analyzer <trace.json>")
+        return 2
+    print_report(read_otlp_json(argv[0]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
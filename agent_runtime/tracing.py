@@ -0,0 +1,394 @@
+"""
+Trace recording for agent runs.
+
+TracingPlugin records one span tree per root run: run -> agent -> sub-agent -> model call /
+tool call, including AgentTool runs nested under the tool call that started them. When the
+root run finishes the tree is written as OTLP-compatible JSON (the OTLP/HTTP JSON encoding
+of ExportTraceServiceRequest), one file per trace. Use agent_runtime/trace_analyzer.py to
+compute the critical path offline.
+
+Runs that raise or are cancelled (e.g. by agent_runtime.deadline.run_with_deadline) are
+exported too: their open spans are closed with an error status when the task running the
+run finishes.
+
+Retries configured with HttpRetryOptions happen inside the google-genai HTTP client, below
+the plugin hooks, so a model span covers every attempt plus the backoff between them. Each
+backoff is recorded as a "retry" child span of the model span, built from the INFO record
+google-genai logs before sleeping ("Retrying ... in 7.0 seconds as it raised ..."). The span
+covers the planned sleep and carries the error that caused it. While runs are traced, the
+google_genai._api_client logger is lowered to INFO so those records are emitted; they also
+reach any handlers you configured. Model calls that ADK itself repeats show up as separate
+model spans with an increasing attempt.
+
+Example:
+
+    runner = Runner(agent=root_agent, ..., plugins=[TracingPlugin(export_dir="traces")])
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+from .blocking import run_blocking
+from .util import on_run_task_done
+
+# Span kinds
+RUN = "run"
+AGENT = "agent"
+MODEL = "model"
+TOOL = "tool"
+RETRY = "retry"
+
+KIND_ATTRIBUTE = "agent_runtime.span_kind"
+
+_PLACEHOLDER = re.compile(r"{+([^{}]*)}+")
+_RETRY_LOG = re.compile(r"^Retrying \S+ in (?P<sleep>[\d.]+) seconds as it (?:raised|returned) (?P<cause>.*?)\.?$", re.DOTALL)
+_GENAI_LOGGER = logging.getLogger("google_genai._api_client")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("agent_runtime_span", default=None)
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: str
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    parent: Optional["Span"] = field(default=None, repr=False, compare=False)
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds."""
+        return ((self.end_ns or self.start_ns) - self.start_ns) / 1e9
+
+
+def state_reads(agent) -> List[str]:
+    """State keys referenced by `{key}` placeholders in the agent's instruction."""
+    instruction = getattr(agent, "instruction", None)
+    if not isinstance(instruction, str):
+        return []
+    keys = []
+    for match in _PLACEHOLDER.finditer(instruction):
+        key = match.group(1).strip().rstrip("?")
+        if key.isidentifier() or key.startswith(("app:", "user:", "temp:")):
+            keys.append(key)
+    return sorted(set(keys))
+
+
+class _RetryLogHandler(logging.Handler):
+    """Turns google-genai's before-sleep retry records into retry spans of the current model span."""
+
+    def __init__(self, plugin: "TracingPlugin"):
+        super().__init__(level=logging.INFO)
+        self.plugin = plugin
+
+    def emit(self, record: logging.LogRecord):
+        match = _RETRY_LOG.match(record.getMessage())
+        if match is not None:
+            # The record is logged from the task making the model call, so the current
+            # context holds that call's span.
+            self.plugin._record_retry(float(match.group("sleep")), match.group("cause"))
+
+
+class TracingPlugin(BasePlugin):
+    """Records agent/model/tool spans and exports each finished trace as OTLP JSON."""
+
+    def __init__(self, export_dir: Optional[str] = "traces", service_name: str = "agents-repo", name: str = "tracing"):
+        super().__init__(name=name)
+        self.export_dir = export_dir
+        self.service_name = service_name
+        self.finished_traces: Dict[str, List[Span]] = {}
+        self._traces: Dict[str, List[Span]] = {}
+        self._open: Dict[tuple, Span] = {}
+        self._model_attempts: Dict[tuple, int] = {}
+        self._run_teardowns: Dict[str, Callable[[], None]] = {}
+        self._exports = set()
+        self._retry_handler = _RetryLogHandler(self)
+        self._genai_log_level: Optional[int] = None
+
+    def _start(self, key: tuple, name: str, kind: str, **attributes) -> Span:
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        span = Span(
+            trace_id=trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            name=name,
+            kind=kind,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+            parent=parent,
+        )
+        self._traces.setdefault(trace_id, []).append(span)
+        self._open[key] = span
+        _current_span.set(span)
+        return span
+
+    def _end(self, key: tuple, error: Optional[BaseException] = None, **attributes) -> Optional[Span]:
+        span = self._open.pop(key, None)
+        if span is None:
+            return None
+        span.end_ns = time.time_ns()
+        span.attributes.update(attributes)
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        if _current_span.get() is span:
+            _current_span.set(span.parent)
+        return span
+
+    def _watch_retries(self, enabled: bool):
+        if enabled and self._genai_log_level is None:
+            self._genai_log_level = _GENAI_LOGGER.level
+            if not _GENAI_LOGGER.isEnabledFor(logging.INFO):
+                _GENAI_LOGGER.setLevel(logging.INFO)
+            _GENAI_LOGGER.addHandler(self._retry_handler)
+        elif not enabled and self._genai_log_level is not None:
+            _GENAI_LOGGER.removeHandler(self._retry_handler)
+            _GENAI_LOGGER.setLevel(self._genai_log_level)
+            self._genai_log_level = None
+
+    def _record_retry(self, sleep: float, cause: str):
+        model_span = _current_span.get()
+        if model_span is None or model_span.kind != MODEL or model_span.trace_id not in self._traces:
+            return
+        attempt = model_span.attributes.get("retry.count", 0) + 1
+        model_span.attributes["retry.count"] = attempt
+        now = time.time_ns()
+        self._traces[model_span.trace_id].append(
+            Span(
+                trace_id=model_span.trace_id,
+                span_id=secrets.token_hex(8),
+                parent_id=model_span.span_id,
+                name=f"retry {attempt}",
+                kind=RETRY,
+                start_ns=now,
+                end_ns=now + int(sleep * 1e9),
+                attributes={"retry.attempt": attempt, "retry.sleep_seconds": sleep},
+                error=cause,
+                parent=model_span,
+            )
+        )
+
+    async def before_run_callback(self, *, invocation_context):
+        invocation_id = invocation_context.invocation_id
+        self._watch_retries(True)
+        self._start(
+            (RUN, invocation_id),
+            f"run {invocation_context.agent.name}",
+            RUN,
+            **{"invocation.id": invocation_id},
+        )
+        self._run_teardowns[invocation_id] = on_run_task_done(
+            lambda error: self._abort_run(invocation_id, error)
+        )
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        unregister = self._run_teardowns.pop(invocation_context.invocation_id, None)
+        if unregister is not None:
+            unregister()
+        if not self._run_teardowns:
+            self._watch_retries(False)
+        span = self._end((RUN, invocation_context.invocation_id))
+        if span is not None and span.parent_id is None:
+            await self._finish_trace(span.trace_id)
+
+    def _abort_run(self, invocation_id: str, error: BaseException):
+        """Closes the spans left open by a run that raised or was cancelled, innermost first."""
+        self._run_teardowns.pop(invocation_id, None)
+        if not self._run_teardowns:
+            self._watch_retries(False)
+        run_span = self._open.get((RUN, invocation_id))
+        if run_span is None:
+            return
+        for key in [key for key, span in self._open.items() if _descends_from(span, run_span)][::-1]:
+            self._end(key, error=error)
+        for key in [key for key in self._model_attempts if key[1] == invocation_id]:
+            del self._model_attempts[key]
+        if run_span.parent_id is None:
+            task = asyncio.get_running_loop().create_task(self._finish_trace(run_span.trace_id))
+            self._exports.add(task)
+            task.add_done_callback(self._exports.discard)
+
+    async def _finish_trace(self, trace_id: str):
+        spans = self._traces.pop(trace_id, [])
+        self.finished_traces[trace_id] = spans
+        if self.export_dir:
+            path = os.path.join(self.export_dir, f"{trace_id}.json")
+            await run_blocking(write_otlp_json, path, spans, self.service_name)
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        self._start(
+            (AGENT, callback_context.invocation_id, agent.name),
+            agent.name,
+            AGENT,
+            **{
+                "agent.name": agent.name,
+                "agent.class": type(agent).__name__,
+                "agent.output_key": getattr(agent, "output_key", None) or "",
+                "agent.state_reads": state_reads(agent),
+            },
+        )
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        self._end((AGENT, callback_context.invocation_id, agent.name))
+        return None
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        key = (MODEL, callback_context.invocation_id, callback_context.agent_name)
+        attempt = self._model_attempts.get(key, 0) + 1
+        self._model_attempts[key] = attempt
+        self._start(
+            key,
+            f"model {llm_request.model or ''}".strip(),
+            MODEL,
+            **{"gen_ai.request.model": llm_request.model or "", "agent.name": callback_context.agent_name, "model.attempt": attempt},
+        )
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if llm_response.partial:
+            return None
+        key = (MODEL, callback_context.invocation_id, callback_context.agent_name)
+        self._model_attempts.pop(key, None)
+        attributes = {}
+        usage = llm_response.usage_metadata
+        if usage is not None:
+            attributes["gen_ai.usage.input_tokens"] = usage.prompt_token_count or 0
+            attributes["gen_ai.usage.output_tokens"] = usage.candidates_token_count or 0
+        self._end(key, **attributes)
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        self._end((MODEL, callback_context.invocation_id, callback_context.agent_name), error=error)
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        self._start(
+            (TOOL, tool_context.function_call_id),
+            f"tool {tool.name}",
+            TOOL,
+            **{"tool.name": tool.name, "agent.name": tool_context.agent_name},
+        )
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        self._end((TOOL, tool_context.function_call_id))
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        self._end((TOOL, tool_context.function_call_id), error=error)
+        return None
+
+
+def _descends_from(span: Span, ancestor: Span) -> bool:
+    while span is not None:
+        if span is ancestor:
+            return True
+        span = span.parent
+    return False
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _python_value(value: dict):
+    if "arrayValue" in value:
+        return [_python_value(v) for v in value["arrayValue"].get("values", [])]
+    if "intValue" in value:
+        return int(value["intValue"])
+    for kind in ("boolValue", "doubleValue", "stringValue"):
+        if kind in value:
+            return value[kind]
+    return None
+
+
+def to_otlp(spans: List[Span], service_name: str = "agents-repo") -> dict:
+    """Encodes spans as an OTLP/JSON ExportTraceServiceRequest."""
+    otlp_spans = []
+    for span in spans:
+        attributes = dict(span.attributes, **{KIND_ATTRIBUTE: span.kind})
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+                "scopeSpans": [{"scope": {"name": "agent_runtime.tracing"}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+def from_otlp(data: dict) -> List[Span]:
+    """Decodes spans written by to_otlp (or any OTLP/JSON export using the span kind attribute)."""
+    spans = []
+    for resource_spans in data.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for item in scope_spans.get("spans", []):
+                attributes = {a["key"]: _python_value(a["value"]) for a in item.get("attributes", [])}
+                status = item.get("status", {})
+                spans.append(
+                    Span(
+                        trace_id=item["traceId"],
+                        span_id=item["spanId"],
+                        parent_id=item.get("parentSpanId") or None,
+                        name=item["name"],
+                        kind=attributes.pop(KIND_ATTRIBUTE, AGENT),
+                        start_ns=int(item["startTimeUnixNano"]),
+                        end_ns=int(item["endTimeUnixNano"]),
+                        attributes=attributes,
+                        error=status.get("message") if status.get("code") == 2 else None,
+                    )
+                )
+    by_id = {span.span_id: span for span in spans}
+    for span in spans:
+        span.parent = by_id.get(span.parent_id)
+    return spans
+
+
+def write_otlp_json(path: str, spans: List[Span], service_name: str = "agents-repo"):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_otlp(spans, service_name), f, indent=2)
+
+
+def read_otlp_json(path: str) -> List[Span]:
+    with open(path, "r", encoding="utf-8") as f:
+        return from_otlp(json.load(f))
@@ -0,0 +1,45 @@
+"""
+Traffic classification for model calls.
+
+Model wrappers in agent_runtime (batching, scheduling) look at the traffic class and tenant
+of the calling context. Interactive traffic is the default; offline jobs mark their runs
+as batch traffic:
+
+    with traffic(BATCH, tenant="nightly-blogs"):
+        async for event in runner.run_async(...):
+            ...
+
+Tasks created inside the block (ParallelAgent branches, parallel tool calls) inherit it.
+"""
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+DEFAULT_TENANT = "default"
+
+_traffic_class: contextvars.ContextVar[str] = contextvars.ContextVar("agent_runtime_traffic_class", default=INTERACTIVE)
+_tenant: contextvars.ContextVar[str] = contextvars.ContextVar("agent_runtime_tenant", default=DEFAULT_TENANT)
+
+
+def current_traffic_class() -> str:
+    return _traffic_class.get()
+
+
+def current_tenant() -> str:
+    return _tenant.get()
+
+
+@contextmanager
+def traffic(traffic_class: str = INTERACTIVE, tenant: Optional[str] = None):
+    """Marks model calls made inside the block with a traffic class and, optionally, a tenant."""
+    class_token = _traffic_class.set(traffic_class)
+    tenant_token = _tenant.set(tenant) if tenant is not None else None
+    try:
+        yield
+    finally:
+        if tenant_token is not None:
+            _tenant.reset(tenant_token)
+        _traffic_class.reset(class_token)
@@ -0,0 +1,55 @@
+import asyncio
+from typing import Callable
+
+from google.adk.agents import LlmAgent
+from google.adk.tools.agent_tool import AgentTool
+
+
+def iter_agents(agent):
+    """Yields the agent and every agent reachable through sub_agents or AgentTool."""
+    seen = set()
+    stack = [agent]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        yield current
+        for tool in getattr(current, "tools", None) or []:
+            if isinstance(tool, AgentTool):
+                stack.append(tool.agent)
+        stack.extend(reversed(current.sub_agents))
+
+
+def wrap_models(root_agent, wrap):
+    """Replaces the model of every LlmAgent in the tree with `wrap(model)`.
+
+    Model names (e.g. "gemini-2.0-flash-001") and inherited models are resolved first, so
+    `wrap` always receives a BaseLlm instance.
+    """
+    for agent in iter_agents(root_agent):
+        if isinstance(agent, LlmAgent):
+            agent.model = wrap(agent.canonical_model)
+
+
+def on_run_task_done(callback: Callable[[BaseException], None]) -> Callable[[], None]:
+    """Calls `callback(error)` once the task executing the current run finishes.
+
+    ADK skips after_run_callback when a run raises or is cancelled (run_with_deadline
+    cancels runs on expiry), so plugins holding per-run state register their teardown here
+    from before_run_callback. after_run_callback calls the returned function to unregister
+    it on a normal finish. A run consumed directly by a long-lived task is only torn down
+    when that task ends.
+    """
+    task = asyncio.current_task()
+    if task is None:
+        return lambda: None
+
+    def done(finished: asyncio.Task):
+        if finished.cancelled():
+            callback(asyncio.CancelledError("run cancelled"))
+        else:
+            callback(RuntimeError("run ended before it completed"))
+
+    task.add_done_callback(done)
+    return lambda: task.remove_done_callback(done)
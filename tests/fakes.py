@@ -0,0 +1,45 @@
+"""Offline stand-ins for Gemini used by the agent_runtime tests."""
+import asyncio
+from typing import AsyncGenerator, Callable, List, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+
+def text_response(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def user_message(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+class FakeLlm(BaseLlm):
+    """Answers after `delay` seconds with `reply(llm_request)`, or echoes the last user text."""
+
+    delay: float = 0.0
+    reply: Optional[Callable[[LlmRequest], LlmResponse]] = None
+    requests: List[LlmRequest] = []
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        self.requests.append(llm_request)
+        await asyncio.sleep(self.delay)
+        if self.reply is not None:
+            yield self.reply(llm_request)
+            return
+        last = llm_request.contents[-1].parts[0].text if llm_request.contents else ""
+        yield text_response(f"echo: {last}")
+
+
+async def new_session(runner: InMemoryRunner, user_id: str = "user"):
+    return await runner.session_service.create_session(app_name=runner.app_name, user_id=user_id)
+
+
+async def run_text(runner: InMemoryRunner, session, text: str) -> List:
+    events = []
+    async for event in runner.run_async(user_id=session.user_id, session_id=session.id, new_message=user_message(text)):
+        events.append(event)
+    return events
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from agent_runtime.batching import BatchBackend, BatchingLlm, MicroBatcher
+from agent_runtime.traffic import BATCH, INTERACTIVE, traffic
+from fakes import FakeLlm, text_response
+
+
+def _request(text: str) -> LlmRequest:
+    return LlmRequest(model="m", contents=[types.Content(role="user", parts=[types.Part(text=text)])])
+
+
+def _text(response) -> str:
+    return response.content.parts[0].text
+
+
+class RecordingBackend(BatchBackend):
+    """Answers each request with its own text and records the size of every batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def predict(self, requests):
+        self.batches.append(len(requests))
+        return [text_response(f"answer to {r.contents[0].parts[0].text}") for r in requests]
+
+
+class ShortBackend(BatchBackend):
+    async def predict(self, requests):
+        return [text_response("only one")]
+
+
+def test_backend_must_implement_predict():
+    with pytest.raises(TypeError):
+        BatchBackend()
+
+
+def test_flushes_after_max_wait_and_routes_each_response_back():
+    backend = RecordingBackend()
+
+    async def main():
+        batcher = MicroBatcher(backend, max_batch_size=10, max_wait_ms=100)
+        started = time.monotonic()
+        responses = await asyncio.gather(*(batcher.submit(_request(f"q{i}")) for i in range(3)))
+        return responses, time.monotonic() - started
+
+    responses, elapsed = asyncio.run(main())
+    assert backend.batches == [3]
+    assert [_text(r) for r in responses] == ["answer to q0", "answer to q1", "answer to q2"]
+    assert 0.09 <= elapsed < 0.5
+
+
+def test_flushes_as_soon_as_a_batch_is_full():
+    backend = RecordingBackend()
+
+    async def main():
+        batcher = MicroBatcher(backend, max_batch_size=2, max_wait_ms=10_000)
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(_request(f"q{i}")) for i in range(4))), timeout=1
+        )
+
+    responses = asyncio.run(main())
+    assert backend.batches == [2, 2]
+    assert [_text(r) for r in responses] == [f"answer to q{i}" for i in range(4)]
+
+
+def test_cancelled_caller_is_dropped_before_the_flush():
+    backend = RecordingBackend()
+
+    async def main():
+        batcher = MicroBatcher(backend, max_batch_size=10, max_wait_ms=50)
+        gone = asyncio.create_task(batcher.submit(_request("gone")))
+        kept = asyncio.create_task(batcher.submit(_request("kept")))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept
+
+    assert _text(asyncio.run(main())) == "answer to kept"
+    assert backend.batches == [1]
+
+
+def test_interactive_traffic_bypasses_the_batcher():
+    backend = RecordingBackend()
+    inner = FakeLlm(model="m")
+
+    async def generate(llm, text):
+        async for response in llm.generate_content_async(_request(text)):
+            return response
+
+    async def main():
+        llm = BatchingLlm(model="m", llm=inner, batcher=MicroBatcher(backend, max_wait_ms=10))
+        with traffic(INTERACTIVE):
+            interactive = await generate(llm, "now")
+        with traffic(BATCH):
+            batched = await generate(llm, "later")
+        return interactive, batched
+
+    interactive, batched = asyncio.run(main())
+    assert _text(interactive) == "echo: now" and len(inner.requests) == 1
+    assert _text(batched) == "answer to later" and backend.batches == [1]
+
+
+def test_missing_results_fail_their_callers():
+    async def main():
+        batcher = MicroBatcher(ShortBackend(), max_batch_size=3, max_wait_ms=10)
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(LlmRequest(model="m")) for _ in range(3)), return_exceptions=True),
+            timeout=1,
+        )
+
+    first, *rest = asyncio.run(main())
+    assert first.content.parts[0].text == "only one"
+    assert all(isinstance(result, RuntimeError) for result in rest)
@@ -0,0 +1,101 @@
+import asyncio
+import inspect
+import threading
+import time
+
+from google.adk.agents import LlmAgent
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.function_tool import FunctionTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+from agent_runtime.blocking import BlockingDetectorPlugin, LoopLagMonitor, offload_sync_tools
+from fakes import FakeLlm, new_session, run_text, text_response
+
+
+def block_the_loop():
+    time.sleep(0.4)
+
+
+def test_stall_records_the_blocking_stack_and_the_task_label():
+    async def labelled(label, work):
+        monitor.set_label(label)
+        await asyncio.sleep(0.1)
+        work()
+
+    async def main():
+        monitor.start()
+        try:
+            # The idle session sets its label last; the stall still belongs to the blocking one.
+            blocker = asyncio.create_task(labelled("tool slow_tool", block_the_loop))
+            await asyncio.sleep(0.05)
+            idle = asyncio.create_task(labelled("tool quick_tool", lambda: None))
+            await asyncio.gather(blocker, idle)
+            await asyncio.sleep(0.1)
+        finally:
+            monitor.stop()
+
+    monitor = LoopLagMonitor(threshold=0.1, interval=0.02)
+    asyncio.run(main())
+    [stall] = monitor.stalls
+    assert stall.label == "tool slow_tool"
+    assert "block_the_loop" in stall.stack and "time.sleep" in stall.stack
+    assert stall.lag > 0.2
+    assert not monitor._labels
+
+
+def record_visit(city: str, tool_context: ToolContext) -> dict:
+    """Records a visit to a city."""
+    tool_context.state["visited"] = city
+    return {"city": city, "thread": threading.current_thread().name}
+
+
+def _call_then_answer(llm_request):
+    last = llm_request.contents[-1].parts[0]
+    if last.function_response:
+        return text_response(str(last.function_response.response["thread"]))
+    call = types.FunctionCall(id="call-1", name="record_visit", args={"city": "Rome"})
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+
+def test_offload_sync_tools_keeps_declaration_and_tool_context():
+    tool = FunctionTool(record_visit)
+    declaration = tool._get_declaration()
+    agent = LlmAgent(name="Guide", model=FakeLlm(model="fake", reply=_call_then_answer), instruction="x", tools=[tool])
+    offload_sync_tools(agent)
+    assert inspect.iscoroutinefunction(tool.func)
+    assert tool._get_declaration() == declaration
+
+    async def main():
+        runner = InMemoryRunner(agent=agent, app_name="app")
+        session = await new_session(runner)
+        events = await run_text(runner, session, "go")
+        session = await runner.session_service.get_session(app_name="app", user_id=session.user_id, session_id=session.id)
+        return events[-1].content.parts[0].text, session.state
+
+    thread, state = asyncio.run(main())
+    assert thread.startswith("agent-blocking")
+    assert state["visited"] == "Rome"
+
+
+def test_monitor_stops_after_cancelled_run():
+    async def main():
+        plugin = BlockingDetectorPlugin()
+        agent = LlmAgent(name="Slow", model=FakeLlm(model="fake", delay=5), instruction="x")
+        runner = InMemoryRunner(agent=agent, app_name="app", plugins=[plugin])
+        session = await new_session(runner)
+        task = asyncio.create_task(run_text(runner, session, "hi"))
+        await asyncio.sleep(0.1)
+        assert plugin.monitor.running
+        task.cancel()
+        await asyncio.wait({task})
+        await asyncio.sleep(0)
+        assert not plugin.monitor.running
+
+        # The counter is not left behind: a normal run starts and stops the monitor again.
+        agent.model = FakeLlm(model="fake")
+        await run_text(runner, session, "hi")
+        assert not plugin.monitor.running
+
+    asyncio.run(main())
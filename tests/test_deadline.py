@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+from google.adk.agents import LlmAgent, ParallelAgent, SequentialAgent
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from agent_runtime.deadline import Deadline, DeadlineExceeded, DeadlinePlugin, clip_retry_options, run_with_deadline
+from fakes import FakeLlm, new_session, text_response, user_message
+
+
+def test_clip_keeps_none():
+    assert clip_retry_options(None, 10) is None
+
+
+def test_unset_fields_use_google_genai_defaults():
+    # Defaults: 5 attempts, waits of 1+1, 2+1, 4+1, 8+1 seconds (jitter 1).
+    assert clip_retry_options(types.HttpRetryOptions(initial_delay=1), 600).attempts == 5
+    assert clip_retry_options(types.HttpRetryOptions(), 6).attempts == 3
+    assert clip_retry_options(types.HttpRetryOptions(jitter=0), 1.5).attempts == 1
+
+
+def test_clip_uses_max_delay_as_cap():
+    options = types.HttpRetryOptions(attempts=10, initial_delay=1, exp_base=7, max_delay=5)
+    # Waits: 2, 5, 5, 5, ... seconds.
+    assert clip_retry_options(options, 13).attempts == 4
+    assert clip_retry_options(options, 1).attempts == 1
+
+
+def test_clip_keeps_other_fields():
+    options = types.HttpRetryOptions(attempts=5, exp_base=7, initial_delay=1, http_status_codes=[429])
+    clipped = clip_retry_options(options, 5)
+    assert clipped.attempts == 2 and clipped.exp_base == 7 and clipped.http_status_codes == [429]
+
+
+def test_plugin_keeps_a_tighter_per_attempt_timeout():
+    seen = []
+
+    def reply(llm_request):
+        seen.append(llm_request.config.http_options.timeout)
+        return text_response("ok")
+
+    async def main():
+        agent = LlmAgent(
+            name="Writer",
+            model=FakeLlm(model="fake", reply=reply),
+            instruction="x",
+            generate_content_config=types.GenerateContentConfig(http_options=types.HttpOptions(timeout=2000)),
+        )
+        runner = InMemoryRunner(agent=agent, app_name="app", plugins=[DeadlinePlugin()])
+        session = await new_session(runner)
+        for timeout in (30, 1):
+            async for _ in run_with_deadline(
+                runner, user_id=session.user_id, session_id=session.id, new_message=user_message("go"), timeout=timeout
+            ):
+                pass
+
+    asyncio.run(main())
+    assert seen[0] == 2000 and 900 < seen[1] <= 1000
+
+
+def test_expiry_cancels_the_run_and_keeps_finished_stages():
+    async def main():
+        fast = LlmAgent(name="Fast", model=FakeLlm(model="fake"), instruction="x", output_key="fast")
+        slow = ParallelAgent(
+            name="Slow",
+            sub_agents=[
+                LlmAgent(name=f"Slow{i}", model=FakeLlm(model="fake", delay=5), instruction="x", output_key=f"slow{i}")
+                for i in range(2)
+            ],
+        )
+        runner = InMemoryRunner(agent=SequentialAgent(name="Root", sub_agents=[fast, slow]), app_name="app", plugins=[DeadlinePlugin()])
+        session = await new_session(runner)
+        started = time.monotonic()
+        async for _ in run_with_deadline(
+            runner, user_id=session.user_id, session_id=session.id, new_message=user_message("go"),
+            timeout=0.3, partial_results=True,
+        ):
+            pass
+        elapsed = time.monotonic() - started
+        state = (await runner.session_service.get_session(app_name="app", user_id=session.user_id, session_id=session.id)).state
+
+        deadline = Deadline(10)
+        asyncio.get_running_loop().call_later(0.1, deadline.cancel, "client disconnected")
+        with pytest.raises(DeadlineExceeded, match="client disconnected"):
+            async for _ in run_with_deadline(
+                runner, user_id=session.user_id, session_id=session.id, new_message=user_message("go"), deadline=deadline
+            ):
+                pass
+        return elapsed, state
+
+    elapsed, state = asyncio.run(main())
+    assert elapsed < 1
+    assert "fast" in state and "slow0" not in state
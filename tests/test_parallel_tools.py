@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from google.adk.agents import LlmAgent
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from agent_runtime.parallel_tools import ParallelToolCallsPlugin
+from fakes import FakeLlm, new_session, run_text, text_response
+
+
+async def lookup(topic: str) -> dict:
+    """Looks up a topic."""
+    await asyncio.sleep(0.01)
+    return {"topic": topic}
+
+
+class Lookups:
+    """A lookup tool that tracks how many calls run at once and can fail one topic."""
+
+    def __init__(self, fail_topic=None):
+        self.fail_topic = fail_topic
+        self.running = 0
+        self.peak = 0
+
+    async def lookup(self, topic: str) -> dict:
+        """Looks up a topic."""
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.05 if topic != self.fail_topic else 0.01)
+            if topic == self.fail_topic:
+                raise ValueError(f"no results for {topic}")
+            return {"topic": topic}
+        finally:
+            self.running -= 1
+
+
+def _three_calls_then_answer(llm_request):
+    if any(part.function_response for part in llm_request.contents[-1].parts):
+        return text_response("done")
+    calls = [
+        types.Part(function_call=types.FunctionCall(id=f"call-{i}", name="lookup", args={"topic": str(i)}))
+        for i in range(3)
+    ]
+    return LlmResponse(content=types.Content(role="model", parts=calls))
+
+
+class RewriteResults(BasePlugin):
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        return {"rewritten": result}
+
+
+class RejectTopicOne(BasePlugin):
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        if tool_args.get("topic") == "1":
+            raise PermissionError("topic 1 is not allowed")
+        return None
+
+
+class SeeToolErrors(BasePlugin):
+    def __init__(self, name="see_errors"):
+        super().__init__(name=name)
+        self.errors = []
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        self.errors.append(tool_context.function_call_id)
+        return None
+
+
+async def _run(plugins, tool=lookup):
+    agent = LlmAgent(name="Researcher", model=FakeLlm(model="fake", reply=_three_calls_then_answer), instruction="x", tools=[tool])
+    runner = InMemoryRunner(agent=agent, app_name="app", plugins=plugins)
+    return await asyncio.wait_for(run_text(runner, await new_session(runner), "go"), timeout=2)
+
+
+def test_permit_is_released_when_an_earlier_plugin_overrides_the_result():
+    plugin = ParallelToolCallsPlugin(max_concurrent_calls=1)
+    events = asyncio.run(_run([RewriteResults(name="rewrite"), plugin]))
+    assert events[-1].content.parts[0].text == "done"
+    assert not plugin._permits and not plugin._calls
+
+
+def test_permit_is_released_when_a_later_before_tool_callback_raises():
+    plugin = ParallelToolCallsPlugin(max_concurrent_calls=1)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await _run([plugin, RejectTopicOne(name="reject")])
+        await asyncio.sleep(0.1)  # let the sibling calls finish
+
+    asyncio.run(main())
+    assert not plugin._permits and not plugin._calls
+
+
+def _function_responses(events):
+    return [part.function_response for event in events for part in event.content.parts if part.function_response]
+
+
+@pytest.mark.parametrize("cap", [1, 2, 3])
+def test_calls_of_one_turn_respect_the_cap(cap):
+    lookups = Lookups()
+    asyncio.run(_run([ParallelToolCallsPlugin(max_concurrent_calls=cap)], lookups.lookup))
+    assert lookups.peak == cap
+
+
+def test_failing_call_is_returned_as_an_error_and_siblings_keep_their_order():
+    plugin = ParallelToolCallsPlugin(return_errors=True)
+    events = asyncio.run(_run([plugin], Lookups(fail_topic="1").lookup))
+    responses = _function_responses(events)
+    assert [r.id for r in responses] == ["call-0", "call-1", "call-2"]
+    assert responses[0].response == {"topic": "0"} and responses[2].response == {"topic": "2"}
+    assert responses[1].response == {"error": "lookup failed: no results for 1"}
+    assert events[-1].content.parts[0].text == "done"
+
+
+@pytest.mark.parametrize("return_errors", [True, False])
+def test_one_record_per_call(return_errors):
+    plugin = ParallelToolCallsPlugin(max_concurrent_calls=2, return_errors=return_errors)
+
+    async def main():
+        try:
+            await _run([plugin], Lookups(fail_topic="1").lookup)
+        except ValueError:
+            assert not return_errors
+        await asyncio.sleep(0.1)  # let the sibling calls finish
+
+    asyncio.run(main())
+    records = sorted(plugin.records, key=lambda r: r.function_call_id)
+    assert [r.function_call_id for r in records] == ["call-0", "call-1", "call-2"]
+    assert [r.error for r in records] == [None, "ValueError: no results for 1", None]
+    assert all(r.tool_name == "lookup" and r.agent_name == "Researcher" for r in records)
+    assert not plugin._permits and not plugin._calls
+
+
+def test_later_plugins_see_tool_errors_by_default():
+    see_errors = SeeToolErrors()
+
+    async def main():
+        with pytest.raises(ValueError):
+            await _run([ParallelToolCallsPlugin(), see_errors], Lookups(fail_topic="1").lookup)
+
+    asyncio.run(main())
+    assert see_errors.errors == ["call-1"]
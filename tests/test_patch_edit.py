@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from google.adk.agents import LlmAgent
+from google.adk.runners import InMemoryRunner
+
+from agent_runtime.patch_edit import (
+    FULL_REWRITE_INSTRUCTION,
+    PATCH_INSTRUCTION,
+    PatchError,
+    apply_patch,
+    enable_patch_edits,
+    parse_patch,
+    python_code_validator,
+)
+from fakes import FakeLlm, run_text, text_response
+
+SOURCE = "def f():\n    x = 1\n    return x\n"
+
+
+def _block(search, replace):
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+
+def test_replaces_exact_match():
+    hunks = parse_patch(_block("    x = 1", "    x = 2"))
+    assert apply_patch(SOURCE, hunks) == "def f():\n    x = 2\n    return x\n"
+
+
+def test_blocks_apply_in_order():
+    text = _block("    x = 1", "    x = 2") + "\n" + _block("    return x", "    return x + 1")
+    assert apply_patch(SOURCE, parse_patch(text)) == "def f():\n    x = 2\n    return x + 1\n"
+
+
+def test_blank_line_after_search_does_not_merge_lines():
+    hunks = parse_patch(_block("    x = 1\n", "    if True:\n        x = 2"))
+    assert apply_patch(SOURCE, hunks) == "def f():\n    if True:\n        x = 2\n    return x\n"
+
+
+def test_blank_line_after_replace_does_not_add_lines():
+    hunks = parse_patch(_block("    x = 1", "    x = 2\n"))
+    assert apply_patch(SOURCE, hunks) == "def f():\n    x = 2\n    return x\n"
+
+
+def test_empty_replace_deletes_the_whole_line():
+    assert apply_patch(SOURCE, [("    x = 1\n", "")]) == "def f():\n    return x\n"
+
+
+def test_whitespace_tolerant_match_keeps_replacement_indentation():
+    # The model indented SEARCH by one extra space; the replacement is still a full block.
+    hunks = [("     x = 1", "    if True:\n        x = 2")]
+    assert apply_patch(SOURCE, hunks) == "def f():\n    if True:\n        x = 2\n    return x\n"
+
+
+def test_trailing_whitespace_mismatch_keeps_replacement_indentation():
+    hunks = [("    x = 1  ", "    x = 2")]
+    assert apply_patch(SOURCE, hunks) == "def f():\n    x = 2\n    return x\n"
+
+
+@pytest.mark.parametrize("search", ["x", "    y = 3", "\n"])
+def test_rejects_ambiguous_missing_or_empty_search(search):
+    with pytest.raises(PatchError):
+        apply_patch(SOURCE, [(search, "z")])
+
+
+def test_text_without_blocks_is_a_full_rewrite():
+    assert parse_patch("def f():\n    return 2\n") is None
+
+
+STORY = "The cat sat on the mat.\nIt fell asleep.\n"
+
+
+def _refine(replies, source=STORY, validate=None):
+    """Runs a refiner in edit mode whose model answers with `replies` in turn."""
+    replies = list(replies)
+    llm = FakeLlm(model="fake", reply=lambda llm_request: text_response(replies.pop(0)))
+    agent = LlmAgent(name="Refiner", model=llm, instruction="Revise {current_story}.", output_key="current_story")
+    editor = enable_patch_edits(agent, validate=validate)
+
+    async def main():
+        runner = InMemoryRunner(agent=agent, app_name="app")
+        session = await runner.session_service.create_session(
+            app_name="app", user_id="user", state={"current_story": source}
+        )
+        await run_text(runner, session, "revise")
+        session = await runner.session_service.get_session(app_name="app", user_id="user", session_id=session.id)
+        return session.state["current_story"]
+
+    return asyncio.run(main()), editor, llm.requests
+
+
+def test_patch_response_is_applied_to_the_state_value():
+    story, editor, requests = _refine([_block("It fell asleep.", "It purred, then fell asleep.")])
+    assert story == "The cat sat on the mat.\nIt purred, then fell asleep.\n"
+    assert editor.patches_applied == 1 and len(requests) == 1
+    assert PATCH_INSTRUCTION.strip() in requests[0].config.system_instruction
+
+
+def test_rejected_patch_falls_back_to_a_full_rewrite():
+    rewrite = "The dog sat on the mat.\nIt barked.\n"
+    story, editor, requests = _refine([_block("The bird flew.", "The bird sang."), rewrite])
+    assert story == rewrite
+    assert editor.fallbacks == 1 and editor.rejected_rewrites == 0
+    instruction = requests[1].config.system_instruction
+    assert FULL_REWRITE_INSTRUCTION in instruction and PATCH_INSTRUCTION.strip() not in instruction
+
+
+def test_full_rewrite_that_is_another_patch_keeps_the_current_version():
+    bad = _block("The bird flew.", "The bird sang.")
+    story, editor, _ = _refine([bad, bad])
+    assert story == STORY
+    assert editor.fallbacks == 1 and editor.rejected_rewrites == 1
+
+
+def test_invalid_full_rewrite_keeps_the_current_version():
+    code = "def f():\n    return 1\n"
+    story, editor, _ = _refine([_block("    return 1", "    return (1"), "def f(:\n"], source=code, validate=python_code_validator)
+    assert story == code
+    assert editor.rejected_rewrites == 1
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+from google.adk.agents import LlmAgent
+from google.adk.models.llm_request import LlmRequest
+
+from agent_runtime.batching import LocalBatchBackend, MicroBatcher, enable_batching
+from agent_runtime.scheduler import ClassConfig, RequestScheduler, enable_scheduling
+from agent_runtime.traffic import BATCH, INTERACTIVE, traffic
+from fakes import FakeLlm
+
+
+async def _acquire_all(scheduler, requests):
+    """Starts one acquire per (class, tenant) and returns the tasks in submission order."""
+    tasks = [asyncio.create_task(scheduler.acquire(cls, tenant)) for cls, tenant in requests]
+    await asyncio.sleep(0)
+    return tasks
+
+
+def _granted(tasks):
+    return [task.done() for task in tasks]
+
+
+def _scheduler(preempted_concurrency=0, spike_threshold=2, max_concurrency=8):
+    return RequestScheduler(
+        max_concurrency=max_concurrency,
+        spike_threshold=spike_threshold,
+        classes={
+            INTERACTIVE: ClassConfig(priority=0, max_concurrency=4),
+            BATCH: ClassConfig(priority=1, max_concurrency=4, preemptible=True, preempted_concurrency=preempted_concurrency),
+        },
+    )
+
+
+@pytest.mark.parametrize("preempted_concurrency", [0, 2])
+def test_spike_lowers_the_batch_limit_before_the_global_limit(preempted_concurrency):
+    async def main():
+        scheduler = _scheduler(preempted_concurrency)
+        await _acquire_all(scheduler, [(INTERACTIVE, "t")] * 2)
+        batch = await _acquire_all(scheduler, [(BATCH, "t")] * 4)
+        return _granted(batch), scheduler.stats()
+
+    batch, stats = asyncio.run(main())
+    # 2 of 8 global slots are in use, so only the preempted limit stops batch requests.
+    assert batch.count(True) == preempted_concurrency
+    assert stats[BATCH]["held_back"] == 4 - preempted_concurrency
+    assert stats[INTERACTIVE]["in_flight"] + stats[BATCH]["in_flight"] < 8
+
+
+def test_batch_resumes_when_the_spike_ends():
+    async def main():
+        scheduler = _scheduler()
+        await _acquire_all(scheduler, [(INTERACTIVE, "t")] * 2)
+        batch = await _acquire_all(scheduler, [(BATCH, "t")] * 4)
+        scheduler.release(INTERACTIVE)
+        await asyncio.sleep(0)
+        return _granted(batch), scheduler.stats()
+
+    batch, stats = asyncio.run(main())
+    assert batch == [True] * 4
+    assert stats[BATCH]["held_back"] == 4
+
+
+def test_no_spike_below_the_threshold():
+    async def main():
+        scheduler = _scheduler(spike_threshold=3)
+        await _acquire_all(scheduler, [(INTERACTIVE, "t")] * 2)
+        batch = await _acquire_all(scheduler, [(BATCH, "t")] * 4)
+        return _granted(batch), scheduler.stats()
+
+    batch, stats = asyncio.run(main())
+    assert batch == [True] * 4 and stats[BATCH]["held_back"] == 0
+
+
+def test_requests_queued_behind_their_own_cap_do_not_count_towards_a_spike():
+    async def main():
+        scheduler = _scheduler(spike_threshold=5, max_concurrency=16)
+        await _acquire_all(scheduler, [(INTERACTIVE, "t")] * 9)  # 4 in flight, 5 behind the cap
+        batch = await _acquire_all(scheduler, [(BATCH, "t")] * 4)
+        return _granted(batch), scheduler.stats()
+
+    batch, stats = asyncio.run(main())
+    assert stats[INTERACTIVE]["in_flight"] == 4 and stats[INTERACTIVE]["queued"] == 5
+    assert batch == [True] * 4 and stats[BATCH]["held_back"] == 0
+
+
+def test_waiting_on_the_global_limit_is_not_counted_as_held_back():
+    async def main():
+        scheduler = _scheduler(preempted_concurrency=4, max_concurrency=4)
+        await _acquire_all(scheduler, [(BATCH, "t")] * 4)
+        queued_batch = await _acquire_all(scheduler, [(BATCH, "t")] * 2)
+        interactive = await _acquire_all(scheduler, [(INTERACTIVE, "t")] * 2)
+        scheduler.release(BATCH)
+        await asyncio.sleep(0)
+        return _granted(interactive), _granted(queued_batch), scheduler.stats()
+
+    interactive, queued_batch, stats = asyncio.run(main())
+    # Freed slots still go to the higher-priority class first.
+    assert interactive == [True, False] and queued_batch == [False, False]
+    assert stats[BATCH]["held_back"] == 0
+
+
+def test_cancelled_interactive_request_ends_the_spike():
+    async def main():
+        scheduler = _scheduler(max_concurrency=2)
+        await _acquire_all(scheduler, [(INTERACTIVE, "t")])
+        waiting = await _acquire_all(scheduler, [(INTERACTIVE, "t")] * 2)
+        batch = await _acquire_all(scheduler, [(BATCH, "t")])
+        scheduler.release(INTERACTIVE)
+        await asyncio.sleep(0)
+        waiting[1].cancel()
+        await asyncio.sleep(0)
+        scheduler.release(INTERACTIVE)
+        await asyncio.sleep(0)
+        return _granted(batch)
+
+    assert asyncio.run(main()) == [True]
+
+
+def test_tenants_share_a_class_fairly():
+    async def main():
+        scheduler = RequestScheduler(max_concurrency=1)
+        order = []
+
+        async def call(tenant):
+            async with scheduler.slot(BATCH, tenant):
+                order.append(tenant)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(call(tenant) for tenant in "aaaabb"))
+        return order
+
+    order = asyncio.run(main())
+    assert order[:4] in (["a", "b", "a", "b"], ["b", "a", "b", "a"])
+
+
+def test_unknown_class_is_rejected():
+    async def main():
+        await RequestScheduler().acquire("bulk")
+
+    with pytest.raises(ValueError):
+        asyncio.run(main())
+
+
+def test_each_micro_batch_takes_one_batch_slot():
+    async def main():
+        gemini = FakeLlm(model="fake", delay=0.01)
+        agent = LlmAgent(name="Writer", model=gemini, instruction="x")
+        scheduler = RequestScheduler(max_concurrency=8)
+        batcher = MicroBatcher(LocalBatchBackend(gemini), max_batch_size=32, max_wait_ms=50, scheduler=scheduler)
+        enable_scheduling(agent, scheduler)
+        enable_batching(agent, batcher)
+        with traffic(BATCH):
+            await asyncio.gather(*(_generate(agent.model) for _ in range(32)))
+        return batcher, scheduler.stats()
+
+    batcher, stats = asyncio.run(main())
+    assert batcher.batches_sent == 1 and batcher.requests_sent == 32
+    assert stats[BATCH]["dispatched"] == 1 and stats[BATCH]["in_flight"] == 0
+
+
+def test_scheduling_must_be_enabled_before_batching():
+    agent = LlmAgent(name="Writer", model=FakeLlm(model="fake"), instruction="x")
+    enable_batching(agent, MicroBatcher(LocalBatchBackend(FakeLlm(model="fake"))))
+    with pytest.raises(ValueError):
+        enable_scheduling(agent, RequestScheduler())
+
+
+async def _generate(llm):
+    async for response in llm.generate_content_async(LlmRequest(model="fake")):
+        return response
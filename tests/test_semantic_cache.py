@@ -0,0 +1,86 @@
+import asyncio
+import os
+
+from google.adk.agents import LlmAgent
+from google.adk.runners import InMemoryRunner
+
+from agent_runtime.semantic_cache import SemanticCache, SemanticCachePlugin
+from fakes import FakeLlm, new_session, run_text
+
+
+def _final_text(events):
+    return [e for e in events if e.content and e.content.parts][-1].content.parts[0].text
+
+
+def _runner(cache):
+    llm = FakeLlm(model="fake")
+    agent = LlmAgent(name="ResearchAgent", model=llm, instruction="Research the topic.")
+    plugin = SemanticCachePlugin(cache, thresholds={"ResearchAgent": None})
+    return InMemoryRunner(agent=agent, app_name="app", plugins=[plugin]), llm
+
+
+def test_first_turn_is_served_to_a_reworded_topic():
+    async def main():
+        cache = SemanticCache(ttl_seconds=None)
+        runner, llm = _runner(cache)
+        first = await run_text(runner, await new_session(runner, "u1"), "latest AI agents trends")
+        second = await run_text(runner, await new_session(runner, "u2"), "latest trends in AI agents")
+        return _final_text(first), _final_text(second), len(llm.requests)
+
+    first, second, model_calls = asyncio.run(main())
+    assert first == second == "echo: latest AI agents trends"
+    assert model_calls == 1
+
+
+def test_follow_up_turns_are_not_cached():
+    async def main():
+        cache = SemanticCache(ttl_seconds=None)
+        runner, llm = _runner(cache)
+        u1 = await new_session(runner, "u1")
+        await run_text(runner, u1, "latest AI agents trends")
+        await run_text(runner, u1, "make it shorter")
+        u2 = await new_session(runner, "u2")
+        await run_text(runner, u2, "history of Rome")
+        answer = await run_text(runner, u2, "make it shorter")
+        return _final_text(answer), len(llm.requests), len(cache)
+
+    answer, model_calls, entries = asyncio.run(main())
+    assert answer == "echo: make it shorter"
+    assert model_calls == 4
+    assert entries == 2  # the two first turns only
+
+
+def test_default_threshold_rejects_a_different_topic():
+    cache = SemanticCache(ttl_seconds=None)
+    cache.put("ns", "latest AI agents trends", {"answer": 1})
+    assert cache.lookup("ns", "AI agents trends, latest") is not None
+    assert cache.lookup("ns", "latest AI agents risks") is None
+
+
+def test_concurrent_saves_do_not_collide(tmp_path):
+    path = str(tmp_path / "cache" / "research.npz")
+
+    async def main():
+        cache = SemanticCache(ttl_seconds=None, path=path)
+        runner, _ = _runner(cache)
+        sessions = [await new_session(runner, f"u{i}") for i in range(4)]
+        await asyncio.gather(*(run_text(runner, s, f"topic number {i}") for i, s in enumerate(sessions)))
+
+    asyncio.run(main())
+    assert sorted(os.listdir(tmp_path / "cache")) == ["research.npz"]
+    assert len(SemanticCache(path=path)) == 4
+
+
+def test_failed_save_does_not_fail_the_run(tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+
+    async def main():
+        cache = SemanticCache(ttl_seconds=None, path=str(blocker / "research.npz"))
+        runner, _ = _runner(cache)
+        events = await run_text(runner, await new_session(runner), "latest AI agents trends")
+        return _final_text(events), cache.dirty
+
+    answer, dirty = asyncio.run(main())
+    assert answer == "echo: latest AI agents trends"
+    assert dirty
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import secrets
+
+from google.adk.agents import LlmAgent, SequentialAgent
+from google.adk.runners import InMemoryRunner
+
+from agent_runtime.deadline import run_with_deadline
+from agent_runtime.trace_analyzer import critical_path, independent_stages, parallel_join_idle, retry_backoff
+from agent_runtime.tracing import AGENT, MODEL, RETRY, Span, TracingPlugin, read_otlp_json
+from fakes import FakeLlm, new_session, run_text, text_response, user_message
+
+
+def test_cancelled_run_is_exported_with_error_spans(tmp_path):
+    async def main():
+        plugin = TracingPlugin(export_dir=str(tmp_path))
+        fast = LlmAgent(name="Fast", model=FakeLlm(model="fake"), instruction="x", output_key="fast")
+        slow = LlmAgent(name="Slow", model=FakeLlm(model="fake", delay=5), instruction="x", output_key="slow")
+        runner = InMemoryRunner(agent=SequentialAgent(name="Root", sub_agents=[fast, slow]), app_name="app", plugins=[plugin])
+        session = await new_session(runner)
+        async for _ in run_with_deadline(
+            runner, user_id=session.user_id, session_id=session.id, new_message=user_message("go"),
+            timeout=0.2, partial_results=True,
+        ):
+            pass
+        await asyncio.sleep(0.1)  # the export runs on the thread pool
+        return plugin
+
+    plugin = asyncio.run(main())
+    assert not plugin._open and not plugin._traces
+    [(trace_id, spans)] = plugin.finished_traces.items()
+    assert all(span.end_ns is not None for span in spans)
+    errors = {span.name for span in spans if span.error}
+    assert {"Root", "Slow"} <= errors and "Fast" not in errors
+    assert len(read_otlp_json(str(tmp_path / f"{trace_id}.json"))) == len(spans)
+
+
+def test_genai_retries_become_retry_spans_of_the_model_call():
+    genai_logger = logging.getLogger("google_genai._api_client")
+    level = genai_logger.level
+
+    def reply_after_two_retries(llm_request):
+        for sleep in (1.3, 7.6):
+            genai_logger.info(
+                f"Retrying google.genai._api_client.BaseApiClient._async_request_once in {sleep} seconds "
+                "as it raised ClientError: 429 RESOURCE_EXHAUSTED."
+            )
+        return text_response("ok")
+
+    async def main():
+        plugin = TracingPlugin(export_dir=None)
+        agent = LlmAgent(name="Writer", model=FakeLlm(model="fake", reply=reply_after_two_retries), instruction="x")
+        runner = InMemoryRunner(agent=agent, app_name="app", plugins=[plugin])
+        await run_text(runner, await new_session(runner), "go")
+        return plugin
+
+    plugin = asyncio.run(main())
+    [spans] = plugin.finished_traces.values()
+    [model] = [span for span in spans if span.kind == MODEL]
+    retries = [span for span in spans if span.kind == RETRY]
+    assert [span.parent_id for span in retries] == [model.span_id] * 2
+    assert [round(span.duration, 1) for span in retries] == [1.3, 7.6]
+    assert all("429 RESOURCE_EXHAUSTED" in span.error for span in retries)
+    [backoff] = retry_backoff(spans)
+    assert backoff.retries == 2 and round(backoff.backoff, 1) == 8.9
+    assert genai_logger.level == level and not genai_logger.handlers
+
+
+def _agent_span(name, parent, start, end, kind=AGENT, **attributes):
+    return Span(
+        trace_id="t", span_id=secrets.token_hex(8), parent_id=parent.span_id if parent else None,
+        name=name, kind=kind, start_ns=start, end_ns=end, attributes=attributes, parent=parent,
+    )
+
+
+def _seconds(value):
+    return int(value * 1e9)
+
+
+def test_critical_path_and_parallel_join_idle():
+    # Root runs Outline, then a ParallelAgent whose Slow branch finishes 4s after Fast.
+    root = _agent_span("Root", None, 0, _seconds(10), **{"agent.class": "SequentialAgent"})
+    outline = _agent_span("Outline", root, 0, _seconds(3))
+    outline_model = _agent_span("model", outline, _seconds(0.1), _seconds(2.9), kind=MODEL)
+    team = _agent_span("Team", root, _seconds(3), _seconds(10), **{"agent.class": "ParallelAgent"})
+    fast = _agent_span("Fast", team, _seconds(3), _seconds(6))
+    slow = _agent_span("Slow", team, _seconds(3), _seconds(10))
+    spans = [root, outline, outline_model, team, fast, slow]
+
+    path = critical_path(spans)
+    assert [(span.name, depth) for span, depth in path] == [
+        ("Root", 0), ("Outline", 1), ("model", 2), ("Team", 1), ("Slow", 2),
+    ]
+    [join] = parallel_join_idle(spans)
+    assert join.parallel is team and join.straggler is slow
+    assert round(join.idle, 3) == 4.0
+
+
+def test_loop_stages_are_compared_within_one_iteration():
+    loop = _agent_span("Loop", None, 0, 400, **{"agent.class": "LoopAgent"})
+    spans = [loop]
+    for i in range(2):
+        base = i * 200
+        spans.append(_agent_span("Critic", loop, base, base + 100, **{"agent.output_key": "critique"}))
+        spans.append(
+            _agent_span("Refiner", loop, base + 100, base + 200, **{"agent.output_key": "story", "agent.state_reads": ["critique"]})
+        )
+    # Critic reads nothing, but Refiner -> next Critic crosses an iteration boundary.
+    assert independent_stages(spans) == []
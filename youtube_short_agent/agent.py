@@ -1,9 +1,11 @@
 from google.adk.agents import LlmAgent
+from google.adk.apps import App
 from google.adk.tools import google_search
 from google.adk.tools.agent_tool import AgentTool
 from google.adk.models import Gemini
 from google.genai import types
 from .util import load_instruction_from_file
+from agent_runtime.parallel_tools import ParallelToolCallsPlugin
 
 
 retry_config=types.HttpRetryOptions(
@@ -73,3 +75,15 @@ youtube_shorts_agent = LlmAgent(
 # The runner will now execute the workflow
 
 root_agent = youtube_shorts_agent
+
+
+# --- App for `adk web` / `adk run` ---
+# The coordinator can call several AgentTools in one turn. They run concurrently
+# (at most 3 at a time), and a failing call is returned to the model as an error
+# instead of failing the whole turn.
+
+app = App(
+    name="youtube_short_agent",
+    root_agent=root_agent,
+    plugins=[ParallelToolCallsPlugin(max_concurrent_calls=3, return_errors=True)],
+)
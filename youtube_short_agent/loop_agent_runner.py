@@ -59,6 +59,9 @@ from google.genai import types
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from util import load_instruction_from_file
+from agent_runtime.blocking import BlockingDetectorPlugin, offload_sync_tools
+from agent_runtime.tracing import TracingPlugin
+from agent_runtime.deadline import DeadlinePlugin, run_with_deadline
 
 # Load .env
 # Replace the API_KEY in .env file.
@@ -71,11 +74,22 @@ APP_NAME = "youtube_shorts_app"
 USER_ID = "12345"
 SESSION_ID = "123344"
 
+# Run sync tools on a thread pool instead of the event loop, and report any
+# remaining event-loop stalls over 100ms with a stack snapshot.
+offload_sync_tools(youtube_shorts_agent)
+
 # Session and Runner
 async def setup_session_and_runner():
     session_service = InMemorySessionService()
     session = await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
-    runner = Runner(agent=youtube_shorts_agent, app_name=APP_NAME, session_service=session_service)
+    runner = Runner(
+        agent=youtube_shorts_agent,
+        app_name=APP_NAME,
+        session_service=session_service,
+        # Each run is written to traces/<trace_id>.json; inspect it with
+        # `python -m agent_runtime.trace_analyzer traces/<trace_id>.json`.
+        plugins=[BlockingDetectorPlugin(threshold=0.1), TracingPlugin(export_dir="traces"), DeadlinePlugin()],
+    )
     return session, runner
 
 
@@ -83,7 +97,11 @@ async def setup_session_and_runner():
 async def call_agent_async(query):
     content = types.Content(role='user', parts=[types.Part(text=query)])
     session, runner = await setup_session_and_runner()
-    events = runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
+    # Give the whole loop 5 minutes; retries are clipped to what is left, and on expiry
+    # the run is cancelled and we keep whatever was produced so far.
+    events = run_with_deadline(
+        runner, user_id=USER_ID, session_id=SESSION_ID, new_message=content, timeout=300, partial_results=True
+    )
 
     async for event in events:
         if event.is_final_response():